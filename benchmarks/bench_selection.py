@@ -0,0 +1,42 @@
+"""
+Micro-benchmarks for the headless selection engine.
+
+Run from the project root:
+    python -m benchmarks.bench_selection [--sizes 10 1000 ...] [--draws N]
+"""
+import argparse
+import time
+
+from core.selection import DrawMode, SelectionEngine
+
+DEFAULT_SIZES = [10, 1_000, 100_000, 10_000_000]
+
+
+def time_draws(engine: SelectionEngine, mode: DrawMode, draws: int) -> float:
+    """Return the number of draws per second achieved for the given mode"""
+    draw = getattr(engine, mode.value)
+    start = time.perf_counter()
+    for _ in range(draws):
+        draw()
+    elapsed = time.perf_counter() - start
+    return draws / elapsed if elapsed else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure selection engine draws/second")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--draws", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'size':>12} {'load (s)':>10} " + " ".join(f"{mode.value:>14}" for mode in DrawMode))
+    for size in args.sizes:
+        start = time.perf_counter()
+        engine = SelectionEngine([f"Item {i}" for i in range(size)])
+        load_time = time.perf_counter() - start
+
+        rates = [time_draws(engine, mode, args.draws) for mode in DrawMode]
+        print(f"{size:>12} {load_time:>10.3f} " + " ".join(f"{rate:>14,.0f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Micro-benchmarks for the JSON schema validator.
+
+Run from the project root:
+    python -m benchmarks.bench_validation [--size N] [--repeat N]
+"""
+import argparse
+import time
+
+from core.__info__ import GENERATOR_SCHEMA, LIST_SCHEMA
+from core.data import JSONHandler, JSONValidator, compile_schema
+
+COLOUR_ARRAY_SCHEMA = {
+    "type": "array",
+    "items": {"type": "string", "pattern": "^#([A-Fa-f0-9]{6})$"}
+}
+STRING_ARRAY_SCHEMA = {"type": "array", "items": {"type": "string"}}
+
+
+def time_call(function, repeat: int) -> float:
+    """Return the best time in seconds taken by a call"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure JSON schema validation cost")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    colours = [f"#{i:06X}" for i in range(args.size)]
+    strings = [f"Item {i}" for i in range(args.size)]
+    entries = [{"text": f"Item {i}", "weight": i % 5 + 1, "tags": ["a"]} for i in range(args.size)]
+    config = JSONHandler("config/app_config.json").get("generator_config")
+
+    # Compiled without the schema cache, so every repeat measures a full compile
+    compile_time = time_call(lambda: compile_schema(GENERATOR_SCHEMA, cache=False), args.repeat)
+    cases = [
+        (f"{args.size:,} colour strings", COLOUR_ARRAY_SCHEMA, colours),
+        (f"{args.size:,} plain strings", STRING_ARRAY_SCHEMA, strings),
+        (f"{args.size:,} list entries", LIST_SCHEMA, entries),
+        ("generator_config", GENERATOR_SCHEMA, config),
+    ]
+
+    print(f"{'compile generator schema':<30} {compile_time * 1e6:>12.1f} us")
+    for name, schema, data in cases:
+        validator = JSONValidator(schema)
+        elapsed = time_call(lambda: validator.validate(data), args.repeat)
+        print(f"{name:<30} {elapsed * 1e3:>12.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
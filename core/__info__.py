@@ -18,6 +18,7 @@ LOG_LEVEL = "DEBUG"
 # Directory Definitions
 ASSETS_DIR = "assets"
 CONFIG_DIR = "config"
+STATE_DIR = f"{CONFIG_DIR}/state"
 LOGS_DIR = "logs"
 LOCALE_DIR = f"{ASSETS_DIR}/locales"
 SOUNDS_DIR = f"{ASSETS_DIR}/sounds"
@@ -36,6 +37,10 @@ GENERATOR_SCHEMA = {
             "maxItems": 2
         },
         "sound_file": {"type": "string"},
+        "no_repeat_window": {"type": "integer"},
+        "random_mode": {"type": "string", "enum": ["random", "fair"]},
+        "random_seed": {"type": "integer"},
+        "list_store": {"type": "string", "enum": ["json", "sqlite"]},
         "font": {
             "type": "object",
             "properties": {
@@ -96,6 +101,36 @@ MAIN_SCHEMA = {
     "required": ["generator_config", "editor_config"]
 }
 
+LIST_SCHEMA = {
+    "type": ["array", "object"],
+    # Inline lists hold plain strings or entry objects
+    "items": {
+        "type": ["string", "object"],
+        "properties": {
+            "text": {"type": "string"},
+            "weight": {"type": "number", "minimum": 0},
+            "tags": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["text"]
+    },
+    # External lists are read from a text/CSV file
+    "properties": {
+        "source": {"type": "string"},
+        "column": {"type": "integer"},
+        "weight_column": {"type": "integer"},
+        "delimiter": {"type": "string"},
+        "header": {"type": "boolean"},
+        "encoding": {"type": "string"},
+        "sample_size": {"type": "integer"}
+    },
+    "required": ["source"]
+}
+
+LISTS_SCHEMA = {
+    "type": "object",
+    "additionalProperties": LIST_SCHEMA
+}
+
 # Language Names Map
 LANGUAGE_MAP = {
     'en': 'English',
@@ -0,0 +1,315 @@
+"""
+Compiled binary form of lists.json, opened with mmap.
+
+Layout (all integers little-endian, sections 8-byte aligned):
+    header      magic, version, source mtime/size, list count, directory offset
+    sections    per list: the offset table, UTF-8 blob, weights and tag bitmaps,
+                or for external sources only the source object as JSON
+    directory   per list: name, item count, section positions, a checksum of
+                the list's source text and its tag names
+
+Opening the file only reads the header and directory, so startup cost does not
+depend on the size of the lists, and drawing from a list only touches the
+pages holding the items that are actually drawn. When lists.json changes, it
+is scanned for the extent of each list without decoding the values, and only
+the lists whose source text changed are decoded, validated against
+LIST_SCHEMA and compiled again.
+"""
+from __future__ import annotations
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+from core.__info__ import LIST_SCHEMA
+from core.data import JSONKeyIndex, JSONValidator
+from core.errors import ValidationError
+from core.lists import CompactList, TagIndex, filter_entries
+from core.sources import ExternalSource
+
+MAGIC = b"RGLB"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHHQQIQ")
+NAME = struct.Struct("<H")
+LIST_ENTRY = struct.Struct("<QBQQQQII")
+TAG_ENTRY = struct.Struct("<QQ")
+
+
+def _encode_name(name: str) -> bytes:
+    data = name.encode("utf-8")
+    return NAME.pack(len(data)) + data
+
+
+def _write_section(out, data) -> int:
+    """Write data at the next 8-byte boundary and return its position"""
+    out.write(bytes(-out.tell() % 8))
+    position = out.tell()
+    out.write(data)
+    return position
+
+
+def _source_signature(json_file: str) -> tuple:
+    """Return the mtime and size of lists.json, or zeros if it does not exist"""
+    try:
+        source = os.stat(json_file)
+    except FileNotFoundError:
+        return 0, 0
+    return source.st_mtime_ns, source.st_size
+
+
+def is_stale(json_file: str, compiled_file: str) -> bool:
+    """Return whether the compiled file is missing or older than lists.json"""
+    try:
+        with open(compiled_file, "rb") as compiled:
+            header = compiled.read(HEADER.size)
+    except FileNotFoundError:
+        return True
+    if len(header) < HEADER.size:
+        return True
+    magic, version, _, mtime_ns, size, _, _ = HEADER.unpack(header)
+    return (magic, version, mtime_ns, size) != (MAGIC, VERSION, *_source_signature(json_file))
+
+
+def _compile_list(out, source: bytes, list_name: str) -> tuple:
+    """
+    Write the sections of a list decoded from its source text.
+
+    Raises:
+        ValidationError: If the list does not match LIST_SCHEMA, or every
+            entry has a weight of zero.
+    """
+    entries = json.loads(source.decode("utf-8"))
+    JSONValidator(LIST_SCHEMA).validate(entries, path=f"root.{list_name}")
+    if isinstance(entries, dict):
+        # External sources are stored as their JSON object, flagged by an index size of 0
+        blob = json.dumps(entries).encode("utf-8")
+        return (0, 0, 0, _write_section(out, blob), len(blob), 0), []
+
+    compact = CompactList.from_entries(entries)
+    if compact.weights is not None and not any(compact.weights):
+        raise ValidationError(f"root.{list_name}: At least one entry must have a positive weight")
+    tag_index = TagIndex(entries)
+
+    offsets_pos = _write_section(out, compact.offsets.tobytes())
+    blob_pos = _write_section(out, compact.blob)
+    weights_pos = 0
+    if compact.weights is not None:
+        weights_pos = _write_section(out, compact.weights.tobytes())
+
+    tags = []
+    for tag, bitmap in tag_index.bitmaps.items():
+        data = bitmap.to_bytes((tag_index.size + 7) // 8, "little")
+        tags.append((tag, _write_section(out, data), len(data)))
+
+    entry = (len(compact), compact.offsets.itemsize, offsets_pos, blob_pos, len(compact.blob), weights_pos)
+    return entry, tags
+
+
+def _copy_list(out, previous: CompiledLists, list_name: str) -> tuple:
+    """Copy the sections of an unchanged list from a previously compiled file"""
+    (count, itemsize, offsets_pos, blob_pos, blob_size, weights_pos, _, _), old_tags = previous.directory[list_name]
+    section = previous.section
+
+    if itemsize:
+        offsets_pos = _write_section(out, section(offsets_pos, (count + 1) * itemsize))
+    blob_pos = _write_section(out, section(blob_pos, blob_size))
+    if weights_pos:
+        weights_pos = _write_section(out, section(weights_pos, count * 8))
+
+    tags = [
+        (tag, _write_section(out, section(position, length)), length)
+        for tag, (position, length) in old_tags.items()
+    ]
+    return (count, itemsize, offsets_pos, blob_pos, blob_size, weights_pos), tags
+
+
+def compile_lists(json_file: str, compiled_file: str, fallback: bool = False) -> str:
+    """
+    Compile lists.json into the binary list format. Lists whose source text is
+    unchanged since the previous compile are copied rather than decoded again.
+    The file is written to a new temporary path first and moved into place, so
+    readers never see a partial file. A missing lists.json compiles to a file
+    without any lists.
+
+    Args:
+        json_file (str): The path of lists.json.
+        compiled_file (str): The path of the compiled file.
+        fallback (bool): Whether to keep the new file at its temporary path when
+            the compiled file cannot be replaced, as on Windows while another
+            reader has it mapped, instead of removing it and raising.
+
+    Returns:
+        str: The path holding the new compiled lists.
+
+    Raises:
+        ValidationError: If a changed list does not match LIST_SCHEMA.
+    """
+    mtime_ns, size = _source_signature(json_file)
+    index = JSONKeyIndex(json_file)
+    try:
+        names = index.keys()
+    except FileNotFoundError:
+        names = []
+
+    previous = None
+    try:
+        previous = CompiledLists(compiled_file)
+    except (OSError, ValueError, struct.error):
+        pass
+
+    fd, temp_file = tempfile.mkstemp(
+        prefix=f"{os.path.basename(compiled_file)}.", suffix=".tmp", dir=os.path.dirname(compiled_file) or "."
+    )
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(bytes(HEADER.size))
+
+            directory = []
+            for name in names:
+                list_source = index.raw(name)
+                checksum = zlib.crc32(list_source)
+                if previous is not None and previous.checksum(name) == checksum:
+                    entry, tags = _copy_list(out, previous, name)
+                else:
+                    entry, tags = _compile_list(out, list_source, name)
+                directory.append((name, LIST_ENTRY.pack(*entry, checksum, len(tags)), tags))
+
+            directory_pos = _write_section(out, b"")
+            for name, entry, tags in directory:
+                out.write(_encode_name(name) + entry)
+                for tag, position, length in tags:
+                    out.write(_encode_name(tag) + TAG_ENTRY.pack(position, length))
+
+            out.seek(0)
+            out.write(HEADER.pack(
+                MAGIC, VERSION, 0, mtime_ns, size, len(directory), directory_pos
+            ))
+    except BaseException:
+        # Leave the previously compiled file in place
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    finally:
+        if previous is not None:
+            previous.close()
+
+    try:
+        os.replace(temp_file, compiled_file)
+    except PermissionError:
+        if fallback:
+            return temp_file
+        os.remove(temp_file)
+        raise
+    return compiled_file
+
+
+class CompiledLists:
+    def __init__(self, compiled_file: str, temporary: bool = False):
+        """
+        Args:
+            compiled_file (str): The path of the compiled file.
+            temporary (bool): Whether the file is removed when it is closed.
+        """
+        self.file_name = compiled_file
+        self.temporary = temporary
+        with open(compiled_file, "rb") as compiled:
+            self._map = mmap.mmap(compiled.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        magic, version, _, _, _, list_count, position = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported compiled list file: {compiled_file}")
+
+        self.directory = {}
+        for _ in range(list_count):
+            name, position = self._read_name(position)
+            entry = LIST_ENTRY.unpack_from(self._map, position)
+            position += LIST_ENTRY.size
+            tags = {}
+            for _ in range(entry[-1]):
+                tag, position = self._read_name(position)
+                tags[tag] = TAG_ENTRY.unpack_from(self._map, position)
+                position += TAG_ENTRY.size
+            self.directory[name] = (entry, tags)
+
+        self.tag_indexes = {}
+
+    @classmethod
+    def open(cls, json_file: str, compiled_file: str) -> CompiledLists:
+        """Open the compiled lists, recompiling them first if lists.json has changed"""
+        if is_stale(json_file, compiled_file):
+            # A running generator keeps the compiled file mapped, which prevents
+            # it from being replaced on Windows. The new lists are then read from
+            # their temporary file until a later compile can move them into place.
+            file_name = compile_lists(json_file, compiled_file, fallback=True)
+            return cls(file_name, temporary=file_name != compiled_file)
+        return cls(compiled_file)
+
+    def close(self):
+        """
+        Unmap the file. Lists returned by get() must no longer be in use,
+        otherwise the mapping is left for the garbage collector to release.
+        """
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        if self.temporary:
+            try:
+                os.remove(self.file_name)
+            except OSError:
+                pass
+
+    def section(self, position: int, length: int) -> bytes:
+        """Return a copy of a section of the file"""
+        return self._map[position:position + length]
+
+    def checksum(self, list_name: str):
+        """Return the checksum of a list's source text, or None if it is not compiled"""
+        if list_name not in self.directory:
+            return None
+        return self.directory[list_name][0][6]
+
+    def _read_name(self, position: int) -> tuple[str, int]:
+        (length,) = NAME.unpack_from(self._map, position)
+        start = position + NAME.size
+        return str(self._view[start:start + length], "utf-8"), start + length
+
+    def keys(self) -> list:
+        return list(self.directory)
+
+    def get(self, list_name: str, default=None) -> CompactList:
+        """Return a list backed directly by the mapped file"""
+        if list_name not in self.directory or self.directory[list_name][0][1] == 0:
+            return default
+        (count, itemsize, offsets_pos, blob_pos, blob_size, weights_pos, _, _), _ = self.directory[list_name]
+        offsets = self._view[offsets_pos:offsets_pos + (count + 1) * itemsize].cast("I" if itemsize == 4 else "Q")
+        blob = self._view[blob_pos:blob_pos + blob_size]
+        weights = self._view[weights_pos:weights_pos + count * 8].cast("d") if weights_pos else None
+        return CompactList(blob, offsets, weights)
+
+    def source(self, list_name: str, base_dir: str = ".") -> ExternalSource:
+        """Return the external source of a list, or None if its items are stored in lists.json"""
+        if list_name not in self.directory:
+            return None
+        (_, itemsize, _, blob_pos, blob_size, _, _, _), _ = self.directory[list_name]
+        if itemsize:
+            return None
+        return ExternalSource.from_spec(json.loads(self.section(blob_pos, blob_size)), base_dir)
+
+    def tag_index(self, list_name: str) -> TagIndex:
+        if list_name not in self.tag_indexes:
+            (count, *_), tags = self.directory[list_name]
+            self.tag_indexes[list_name] = TagIndex.from_bitmaps(count, {
+                tag: int.from_bytes(self._view[position:position + length], "little")
+                for tag, (position, length) in tags.items()
+            })
+        return self.tag_indexes[list_name]
+
+    def filter(self, list_name: str, expression: str) -> CompactList:
+        """Return the items of a list matching a tag filter, see parse_tag_filter()"""
+        return filter_entries(self.get(list_name, []), expression, lambda: self.tag_index(list_name))
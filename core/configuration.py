@@ -1,68 +1,162 @@
+"""
+Application settings, parsed and validated once per process.
+
+get_settings() returns an immutable snapshot of app_config.json. Every caller
+receives the same snapshot until the file changes on disk, at which point the
+next call parses the new version. Each section is validated the first time
+its settings are requested, so the editor still opens (and can be used to fix
+the file) when generator_config is invalid.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, fields
+from functools import cached_property
+import os
+import threading
+
+from .__info__ import EDITOR_SCHEMA, GENERATOR_SCHEMA
 from .data import JSONHandler, JSONValidator
 
+# Configuration paths of the generator settings, relative to "generator_config"
+GENERATOR_PATHS = {
+    "app_size": ("window_size",),
+    "app_fontface": ("font", "face"),
+    "app_fontsize": ("font", "size"),
+    "random_cols": ("colours", "random_colours"),
+    "app_light_text_col": ("colours", "light_text"),
+    "app_dark_text_col": ("colours", "dark_text"),
+    "enable_sound": ("feature_flags", "enable_sound"),
+    "enable_always_on_top": ("feature_flags", "enable_always_on_top"),
+    "enable_log_to_file": ("feature_flags", "enable_log_to_file"),
+    "sound_fname": ("sound_file",),
+    "no_repeat_window": ("no_repeat_window",),
+    "random_mode": ("random_mode",),
+    "random_seed": ("random_seed",),
+    "list_store": ("list_store",),
+    "language": ("language",),
+    "app_theme": ("theme",),
+}
+
+# Configuration paths of the editor settings, relative to "editor_config"
+EDITOR_PATHS = {
+    "app_theme": ("theme",),
+    "app_size": ("window_size",),
+}
+
+
+def _read_section(settings_class, json_data: JSONHandler, section: str, paths: dict, schema: dict) -> dict:
+    """Validate a configuration section and read the values of a settings class from it"""
+    JSONValidator(schema).validate(json_data.get(section))
+    defaults = {field.name: field.default for field in fields(settings_class)}
+    values = json_data.get_many({(section, *paths[name]): defaults[name] for name in paths})
+    # Arrays are stored as tuples, so that snapshots cannot be modified
+    return {
+        name: tuple(value) if isinstance(value, list) else value
+        for name, value in zip(paths, values)
+    }
+
+
+@dataclass(frozen=True)
 class GeneratorAppSettings:
-    def __init__(self, json_file_name, schema):
-        self.json_data = JSONHandler(json_file_name)
-        self.validator = JSONValidator(schema)
-        self.validator.validate(self.json_data.get("generator_config"))
-
-        # Define the variable map with keys and their corresponding paths and optional fallbacks
-        var_map = {
-            "app_size": (["window_size"], (1024, 768)),
-            "app_fontface": (["font", "face"], "TkDefaultFont"),
-            "app_fontsize": (["font", "size"], 30),
-            "random_cols": (["colours", "random_colours"], False),
-            "app_light_text_col": (["colours", "light_text"], "#FAFAFA"),
-            "app_dark_text_col": (["colours", "dark_text"], "#1C1C1C"),
-            "enable_sound": (["feature_flags", "enable_sound"], True),
-            "enable_always_on_top": (["feature_flags", "enable_always_on_top"], True),
-            "enable_log_to_file": (["feature_flags", "enable_log_to_file"], True),
-            "sound_fname": (["sound_file"], ""),
-            "language": (["language"], ""),
-            "app_theme": (["theme"], "auto")
-        }
-
-        # Static values that don't need a path or fallback
-        static_values = {
-            "app_on_top": True
-        }
-
-        if self.json_data:
-            # Use the variable map to set attributes
-            for var_name, (path, fallback) in var_map.items():
-                path = ["generator_config"] + path
-                value = self.json_data.get(path, default=fallback)
-                setattr(self, var_name, value)
-
-            # Set static values directly
-            for var_name, value in static_values.items():
-                setattr(self, var_name, value)
+    app_size: tuple[int, int] = (1024, 768)
+    app_fontface: str = "TkDefaultFont"
+    app_fontsize: int = 30
+    random_cols: tuple[str, ...] = ()
+    app_light_text_col: str = "#FAFAFA"
+    app_dark_text_col: str = "#1C1C1C"
+    enable_sound: bool = True
+    enable_always_on_top: bool = True
+    enable_log_to_file: bool = True
+    sound_fname: str = ""
+    no_repeat_window: int = 0
+    random_mode: str = "random"
+    random_seed: int | None = None
+    list_store: str = "json"
+    language: str = ""
+    app_theme: str = "auto"
+    app_on_top: bool = True
+
+    @classmethod
+    def from_json(cls, json_data: JSONHandler) -> GeneratorAppSettings:
+        """
+        Raises:
+            ValidationError: If generator_config does not match GENERATOR_SCHEMA.
+        """
+        return cls(**_read_section(cls, json_data, "generator_config", GENERATOR_PATHS, GENERATOR_SCHEMA))
 
 
+@dataclass(frozen=True)
 class EditorAppSettings:
-    def __init__(self, json_file_name, schema):
-        self.json_data = JSONHandler(json_file_name)
-        self.validator = JSONValidator(schema)
-        self.validator.validate(self.json_data.get("editor_config"))
-
-        # Define the variable map with keys and their corresponding paths and optional fallbacks
-        var_map = {
-            "app_theme": (["theme"], "auto"),
-            "app_size": (["window_size"], (1024, 768)),
-        }
-
-        # Static values that don't need a path or fallback
-        static_values = {
-            "app_title": "Configuration Utility"
-        }
-
-        if self.json_data:
-            # Use the variable map to set attributes
-            for var_name, (path, fallback) in var_map.items():
-                path = ["editor_config"] + path
-                value = self.json_data.get(path, default=fallback)
-                setattr(self, var_name, value)
-
-            # Set static values directly
-            for var_name, value in static_values.items():
-                setattr(self, var_name, value)
+    app_theme: str = "auto"
+    app_size: tuple[int, int] = (1024, 768)
+    app_title: str = "Configuration Utility"
+
+    @classmethod
+    def from_json(cls, json_data: JSONHandler) -> EditorAppSettings:
+        """
+        Raises:
+            ValidationError: If editor_config does not match EDITOR_SCHEMA.
+        """
+        return cls(**_read_section(cls, json_data, "editor_config", EDITOR_PATHS, EDITOR_SCHEMA))
+
+
+@dataclass(frozen=True)
+class AppSettings:
+    # The parsed file, shared with every consumer. It must not be modified in
+    # place; JSONHandler's updates copy the objects they change.
+    data: dict
+    signature: tuple
+
+    @cached_property
+    def generator(self) -> GeneratorAppSettings:
+        """
+        Raises:
+            ValidationError: If generator_config does not match GENERATOR_SCHEMA.
+        """
+        return GeneratorAppSettings.from_json(JSONHandler(data=self.data))
+
+    @cached_property
+    def editor(self) -> EditorAppSettings:
+        """
+        Raises:
+            ValidationError: If editor_config does not match EDITOR_SCHEMA.
+        """
+        return EditorAppSettings.from_json(JSONHandler(data=self.data))
+
+
+class SettingsService:
+    def __init__(self, json_file_name: str):
+        self.file_name = json_file_name
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _signature(self) -> tuple:
+        try:
+            stat = os.stat(self.file_name)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self) -> AppSettings:
+        """
+        Return the current settings snapshot, parsing the file again only if
+        it changed since the last snapshot was taken.
+        """
+        signature = self._signature()
+        with self._lock:
+            if self._snapshot is None or self._snapshot.signature != signature:
+                self._snapshot = AppSettings(JSONHandler(self.file_name).json_data, signature)
+            return self._snapshot
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_settings(json_file_name: str) -> AppSettings:
+    """Return the shared settings snapshot of a configuration file"""
+    path = os.path.abspath(json_file_name)
+    with _services_lock:
+        service = _services.get(path)
+        if service is None:
+            service = _services[path] = SettingsService(path)
+    return service.get()
@@ -1,101 +1,382 @@
 from __future__ import annotations
 import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import hashlib
+from itertools import compress, repeat
 import json
+import operator
+import os
 import re
+import shutil
+import sys
+import tempfile
+import threading
 from typing import Dict
 
 from libs import aiofiles
+from libs.aiofiles.ospath import wrap
 from core.errors import ValidationError
 
 
 
+def _create_temp_file(file_name: str) -> str:
+    """Create a uniquely named empty file beside file_name, with the same permissions"""
+    fd, temp_file = tempfile.mkstemp(
+        prefix=f"{os.path.basename(file_name)}.", suffix=".tmp", dir=os.path.dirname(file_name) or "."
+    )
+    os.close(fd)
+    try:
+        shutil.copymode(file_name, temp_file)
+    except OSError:
+        pass
+    return temp_file
+
+
+def _remove_if_exists(file_name: str):
+    try:
+        os.remove(file_name)
+    except FileNotFoundError:
+        pass
+
+
+_fsync = wrap(os.fsync)
+_replace = wrap(os.replace)
+_create_temp = wrap(_create_temp_file)
+_remove = wrap(_remove_if_exists)
+
+# Threads available to the background I/O loop for blocking file operations
+IO_WORKERS = 4
+
+_io_loop = None
+_io_loop_lock = threading.Lock()
+
+
+def _get_io_loop() -> asyncio.AbstractEventLoop:
+    """Return the background event loop used for file I/O, starting it on first use"""
+    global _io_loop
+    with _io_loop_lock:
+        if _io_loop is None:
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(IO_WORKERS, thread_name_prefix="json-io"))
+            threading.Thread(target=loop.run_forever, name="json-io-loop", daemon=True).start()
+            _io_loop = loop
+    return _io_loop
+
+
+def run_io(coro):
+    """
+    Run a coroutine on the shared background I/O loop and wait for its result.
+
+    Raises:
+        RuntimeError: If called from the I/O loop itself, which would deadlock.
+    """
+    loop = _get_io_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("Cannot wait for the I/O loop from within it, await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+# Number of compiled key paths kept for reuse
+KEY_PATH_CACHE_SIZE = 256
+
+# Number of snapshots kept for undo
+HISTORY_SIZE = 100
+
+_MISSING = object()
+
+
+class KeyPath:
+    """A key path into nested JSON objects, parsed once and reused for every access"""
+    __slots__ = ("keys",)
+
+    def __init__(self, keys: tuple):
+        self.keys = keys
+
+    def get(self, data, default=None):
+        try:
+            for key in self.keys:
+                data = data[key] if isinstance(data, dict) else None
+        except KeyError:
+            return default
+        return default if data is None else data
+
+    def assign(self, data: dict, value) -> dict:
+        """
+        Return a copy of data with the value set. Only the objects along the
+        path are copied, everything else is shared with the original.
+        """
+        try:
+            root = node = dict(data)
+            for key in self.keys[:-1]:
+                child = node.get(key)
+                child = dict(child) if isinstance(child, dict) else {}
+                node[key] = child
+                node = child
+            node[self.keys[-1]] = value
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid key path: {'.'.join(self.keys)}") from e
+        return root
+
+
+@lru_cache(maxsize=KEY_PATH_CACHE_SIZE)
+def compile_key_path(keys) -> KeyPath:
+    """
+    Return the compiled form of a dot-separated string or tuple of keys.
+
+    Raises:
+        ValueError: If the key path is empty.
+    """
+    if isinstance(keys, str):
+        keys = tuple(keys.split("."))
+    if not keys:
+        raise ValueError("Key path must not be empty")
+    return KeyPath(keys)
+
+
+def _shared_parents(previous: tuple, path: tuple, available: int) -> int:
+    """Return how many parents of the previous key path can be reused for the next one"""
+    shared = 0
+    limit = min(len(previous), len(path), available) - 1
+    while shared < limit and previous[shared] == path[shared]:
+        shared += 1
+    return shared
+
+
 class JSONHandler:
-    def __init__(self, json_file=None, encoding="utf-8"):
+    def __init__(self, json_file=None, encoding="utf-8", write_delay=0.0, data: dict = None):
+        """
+        Args:
+            json_file (str): The path of the JSON file.
+            encoding (str): The encoding of the JSON file.
+            write_delay (float): Seconds to defer writes by, so that a burst of
+                write() calls results in a single write. 0 writes immediately.
+            data (dict): The file's content if it was already parsed, in which
+                case the file is not read again.
+        """
         self.file_name = json_file
         self.encoding = encoding
-        self.json_data = self._run_sync(self._read_json())
+        self.write_delay = write_delay
+        self._written_digest = None
+        self._pending_write = None
+        self._pending_data = None
+        self._write_lock = threading.RLock()
+        self.json_data = data if data is not None else self._run_sync(self._read_json())
+
+        # Snapshots of json_data. Updates copy the objects they change rather
+        # than modifying them, so snapshots share everything else.
+        self._saved = self.json_data
+        self._undo = deque(maxlen=HISTORY_SIZE)
+        self._redo = []
+
+    @staticmethod
+    def _digest(text: str) -> bytes:
+        return hashlib.sha1(text.encode("utf-8")).digest()
 
     async def _read_json(self) -> Dict[str, any]:
         try:
             async with aiofiles.open(self.file_name, "r", encoding=self.encoding) as json_file:
                 data = await json_file.read()
+                self._written_digest = self._digest(data)
                 return json.loads(data)
         except FileNotFoundError:
             return {}
         except json.JSONDecodeError as e:
             raise e
 
-    async def _write_json(self, data: Dict[str, any]):
+    async def _write_json(self, data: Dict[str, any]) -> bool:
+        text = json.dumps(data, indent=4)
+        digest = self._digest(text)
+        if digest == self._written_digest:
+            self._saved = data
+            return False
+
+        # Write to a temporary file first, so a crash never leaves a truncated file
+        # behind. Each write has its own temporary file, so concurrent writers of
+        # the same file never write into each other's.
+        temp_file = await _create_temp(self.file_name)
         try:
-            async with aiofiles.open(self.file_name, "w", encoding=self.encoding) as json_file:
-                await json_file.write(json.dumps(data, indent=4))
-        except Exception as e:
-            raise e
+            async with aiofiles.open(temp_file, "w", encoding=self.encoding) as json_file:
+                await json_file.write(text)
+                await json_file.flush()
+                await _fsync(json_file.fileno())
+            await _replace(temp_file, self.file_name)
+        except BaseException:
+            await _remove(temp_file)
+            raise
+        self._written_digest = digest
+        self._saved = data
+        return True
 
     def _run_sync(self, coro):
-        try:
-            loop = asyncio.get_running_loop()
-        except RuntimeError:
-            return asyncio.run(coro)
-        else:
-            task = loop.create_task(coro)
-            return loop.run_until_complete(task)
-
-    def _resolve_keys(self, keys):
-        if isinstance(keys, str):
-            keys = keys.split('.')
-        if not isinstance(keys, list):
+        return run_io(coro)
+
+    async def aread(self) -> Dict[str, any]:
+        """
+        Asynchronously re-read the file, replacing the in-memory data.
+        """
+        self._commit(await self._read_json())
+        self.mark_saved()
+        return self.json_data
+
+    async def awrite(self) -> bool:
+        """
+        Asynchronously write the in-memory JSON data to the file, see write().
+
+        Returns:
+            bool: Whether the file was written.
+        """
+        # The write lock is not taken here: flush() holds it while waiting for
+        # the I/O loop, which may be the loop running this coroutine
+        pending, self._pending_write = self._pending_write, None
+        if pending is not None:
+            pending.cancel()
+        self._pending_data = None
+        return await self._write_json(self.json_data)
+
+    def _resolve_keys(self, keys) -> KeyPath:
+        if isinstance(keys, list):
+            keys = tuple(keys)
+        elif not isinstance(keys, (str, tuple)):
             raise TypeError("Keys must be a string or a list.")
-        return keys
+        return compile_key_path(keys)
 
     def get(self, keys, default=None):
-        keys = self._resolve_keys(keys)
-        data = self.json_data
-        try:
-            for key in keys:
-                if not isinstance(data, dict):
-                    return default
-                data = data.get(key, default)
-                if data is None:
-                    return default
-            return data
-        except (KeyError, TypeError):
-            return default
+        return self._resolve_keys(keys).get(self.json_data, default)
+
+    def _holds(self, keys, value) -> bool:
+        """Return whether a key path already holds a value (of the same type)"""
+        current = self._resolve_keys(keys).get(self.json_data, _MISSING)
+        return type(current) is type(value) and current == value
+
+    def get_many(self, paths, default=None) -> list:
+        """
+        Look up several key paths in one pass, walking shared parents once.
+
+        Args:
+            paths (Iterable | dict): Key paths, or a dict mapping each key path
+                to its own default value.
+            default (any): The value returned for missing paths.
+
+        Returns:
+            list: The value of each path, in order.
+        """
+        defaults = paths if isinstance(paths, dict) else dict.fromkeys(paths, default)
+        values = []
+        parents = [self.json_data]
+        previous = ()
+        for keys, path_default in defaults.items():
+            path = self._resolve_keys(keys).keys
+            parents = parents[:_shared_parents(previous, path, len(parents)) + 1]
+            data = parents[-1]
+            for key in path[len(parents) - 1:-1]:
+                data = data.get(key) if isinstance(data, dict) else None
+                parents.append(data)
+            value = data.get(path[-1]) if isinstance(data, dict) else None
+            values.append(path_default if value is None else value)
+            previous = path
+        return values
 
     def set(self, keys, value):
         """
         Update the in-memory JSON data of a specific key without writing to the file.
+        Setting a key to the value it already holds records no change.
         
         Args:
             keys (str | list): Dot-separated string or list of keys representing the path.
             value (any): The value to set at the specified path.
         """
-        keys = self._resolve_keys(keys)
-        data = self.json_data
-        try:
-            for key in keys[:-1]:
-                if key not in data or not isinstance(data[key], dict):
-                    data[key] = {}
-                data = data[key]
-            data[keys[-1]] = value
-        except (TypeError, KeyError) as e:
-            raise ValueError(f"Invalid key path: {'.'.join(keys)}") from e
+        if self._holds(keys, value):
+            return
+        self._commit(self._resolve_keys(keys).assign(self.json_data, value))
+
+    def set_many(self, updates: dict):
+        """
+        Update several key paths in one pass, walking shared parents once. No
+        change is recorded when every key already holds its value.
+
+        Args:
+            updates (dict): Key paths mapped to the values to set.
+        """
+        if all(self._holds(keys, value) for keys, value in updates.items()):
+            return
+        root = dict(self.json_data)
+        copied = {id(root)}
+        parents = [root]
+        previous = ()
+        for keys, value in updates.items():
+            path = self._resolve_keys(keys).keys
+            parents = parents[:_shared_parents(previous, path, len(parents)) + 1]
+            data = parents[-1]
+            for key in path[len(parents) - 1:-1]:
+                # Copy each object on the way once, the original may be shared with a snapshot
+                child = data.get(key)
+                if not isinstance(child, dict):
+                    child = {}
+                elif id(child) not in copied:
+                    child = dict(child)
+                copied.add(id(child))
+                data[key] = child
+                data = child
+                parents.append(data)
+            data[path[-1]] = value
+            previous = path
+        self._commit(root)
 
     def write(self):
         """
-        Write the in-memory JSON data to the file.
+        Write the in-memory JSON data to the file. The file is replaced
+        atomically, and is left untouched when its content would not change.
+        With a write delay, the write is deferred and any further calls made
+        in the meantime are coalesced into it; the data is written as it was
+        at the last call.
+        """
+        with self._write_lock:
+            self._pending_data = self.json_data
+            if self.write_delay <= 0:
+                self._write_pending()
+            elif self._pending_write is None:
+                self._pending_write = threading.Timer(self.write_delay, self.flush)
+                self._pending_write.start()
+
+    def flush(self) -> bool:
+        """
+        Write any deferred changes immediately.
+
+        Returns:
+            bool: Whether the file was written.
         """
-        self._run_sync(self._write_json(self.json_data))
+        with self._write_lock:
+            if self._pending_data is None:
+                return False
+            return self._write_pending()
+
+    def _write_pending(self) -> bool:
+        if self._pending_write is not None:
+            self._pending_write.cancel()
+            self._pending_write = None
+        data, self._pending_data = self._pending_data, None
+        return self._run_sync(self._write_json(data))
 
     def revert(self):
         """
-        Revert the in-memory data to the original state from the file on disk.
+        Revert the in-memory data to the state last read from or written to
+        the file. The revert itself can be undone.
         """
-        self.json_data = self._run_sync(self._read_json())
-    
+        if self.json_data is not self._saved:
+            self._commit(self._saved)
+
     def overwrite(self, new_data: dict):
         """
-        Overwrite the entire JSON data with the new data.
+        Overwrite the entire JSON data with the new data. Top-level values
+        equal to the current ones are kept, so that they stay shared with
+        earlier snapshots.
         
         Args:
             new_data (dict): The new data to replace the existing JSON data.
@@ -105,76 +386,501 @@ class JSONHandler:
         """
         if not isinstance(new_data, dict):
             raise TypeError("New data must be a dictionary.")
-        
-        self.json_data = new_data
+        if new_data == self.json_data:
+            return
+
+        current = self.json_data
+        self._commit({
+            key: current[key] if key in current and current[key] == value else value
+            for key, value in new_data.items()
+        })
+
+    @property
+    def modified(self) -> bool:
+        """Whether the in-memory data differs from the saved state"""
+        return self.json_data is not self._saved
+
+    def mark_saved(self):
+        """Treat the current in-memory data as the saved state, see revert()"""
+        self._saved = self.json_data
+
+    def _commit(self, data: dict):
+        self._undo.append(self.json_data)
+        self._redo.clear()
+        self._restore(data)
+
+    def _restore(self, data: dict):
+        self.json_data = data
+
+    def undo(self) -> bool:
+        """
+        Restore the data as it was before the last change.
+
+        Returns:
+            bool: False if there was nothing to undo.
+        """
+        if not self._undo:
+            return False
+        self._redo.append(self.json_data)
+        self._restore(self._undo.pop())
+        return True
+
+    def redo(self) -> bool:
+        """
+        Reapply the last undone change.
+
+        Returns:
+            bool: False if there was nothing to redo.
+        """
+        if not self._redo:
+            return False
+        self._undo.append(self.json_data)
+        self._restore(self._redo.pop())
+        return True
+
+
+def _compile_container_text() -> re.Pattern:
+    """
+    Compile the pattern matching the inside of a JSON container up to its next
+    bracket that is not part of a string. Containers nested up to two levels
+    deep are consumed by the pattern too, so an array of entry objects is
+    skipped in a single match. Quantifiers are possessive where supported
+    (Python 3.11+), so the engine does not save a backtracking point per string.
+    """
+    plus = "+" if sys.version_info >= (3, 11) else ""
+    string = r'"[^"\\]*' + plus + r'(?:\\.[^"\\]*' + plus + ")*" + plus + '"'
+    separator = r'[^"\[\]{}]*' + plus
+    flat = r"[\[{](?:" + separator + string + ")*" + plus + separator + r"[\]}]"
+    nested = r"[\[{](?:" + separator + "(?:" + string + "|" + flat + "))*" + plus + separator + r"[\]}]"
+    return re.compile("(?:" + separator + "(?:" + string + "|" + nested + "))*" + plus + separator, re.DOTALL)
+
+
+class JSONKeyIndex:
+    """
+    Index of the byte span occupied by each top-level value of a JSON object
+    file, so that the keys can be listed and a single value decoded without
+    decoding the rest of the file. The index is built on first use and rebuilt
+    whenever the file's mtime or size changes.
+    """
+    _whitespace = re.compile(r"\s*")
+    _string = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+    _scalar = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?|true|false|null")
+    _container_text = _compile_container_text()
+
+    def __init__(self, json_file, encoding="utf-8"):
+        self.file_name = json_file
+        self.encoding = encoding
+        self._signature = None
+        self._spans = {}
+
+    def _refresh(self):
+        stat = os.stat(self.file_name)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+
+        with open(self.file_name, "rb") as json_file:
+            text = json_file.read().decode(self.encoding)
+        self._spans = self._scan(text)
+        self._signature = signature
+
+    def _scan(self, text: str) -> Dict[str, tuple]:
+        decoder = json.JSONDecoder()
+        skip = self._whitespace.match
+        spans = {}
+
+        pos = skip(text, 0).end()
+        if text[pos:pos + 1] != "{":
+            raise json.JSONDecodeError("Expecting object", text, pos)
+        pos = skip(text, pos + 1).end()
+        if text[pos:pos + 1] == "}":
+            return spans
+
+        # Byte offsets equal character offsets unless the file contains non-ASCII text
+        ascii_only = text.isascii()
+        byte_pos, char_pos = 0, 0
+        while True:
+            key, pos = decoder.raw_decode(text, pos)
+            pos = skip(text, pos).end()
+            if text[pos:pos + 1] != ":":
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+            start = skip(text, pos + 1).end()
+            end = self._value_end(text, start)
+
+            if ascii_only:
+                spans[key] = (start, end)
+            else:
+                start_byte = byte_pos + len(text[char_pos:start].encode(self.encoding))
+                byte_pos = start_byte + len(text[start:end].encode(self.encoding))
+                char_pos = end
+                spans[key] = (start_byte, byte_pos)
+
+            pos = skip(text, end).end()
+            if text[pos:pos + 1] == ",":
+                pos = skip(text, pos + 1).end()
+            elif text[pos:pos + 1] == "}":
+                return spans
+            else:
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+
+    def _value_end(self, text: str, pos: int) -> int:
+        """
+        Return the end of the JSON value starting at pos. Containers are
+        skipped by tracking bracket depth outside of strings, so no Python
+        objects are built for the value.
+        """
+        char = text[pos:pos + 1]
+        if char not in ("[", "{"):
+            match = (self._string if char == '"' else self._scalar).match(text, pos)
+            if match is None:
+                raise json.JSONDecodeError("Expecting value", text, pos)
+            return match.end()
+
+        depth = 0
+        while True:
+            if char in ("[", "{"):
+                depth += 1
+            elif char in ("]", "}"):
+                depth -= 1
+                if depth == 0:
+                    return pos + 1
+            else:
+                # The end of the file, or a string that is never closed
+                raise json.JSONDecodeError("Unterminated value", text, pos)
+            pos = self._container_text.match(text, pos + 1).end()
+            char = text[pos:pos + 1]
+
+    def keys(self) -> list:
+        self._refresh()
+        return list(self._spans)
+
+    def span(self, key: str) -> tuple:
+        """Return the (start, end) byte offsets of a top-level value"""
+        self._refresh()
+        return self._spans[key]
+
+    def raw(self, key: str) -> bytes:
+        """Return the encoded JSON text of a top-level value"""
+        start, end = self.span(key)
+        with open(self.file_name, "rb") as json_file:
+            json_file.seek(start)
+            return json_file.read(end - start)
+
+    def load(self, key: str, default=None):
+        """Decode a single top-level value"""
+        try:
+            return json.loads(self.raw(key).decode(self.encoding))
+        except KeyError:
+            return default
+
+
+# Validation stops once this many errors have been recorded
+MAX_VALIDATION_ERRORS = 100
+
+# Python types accepted for each schema type
+_SCHEMA_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+}
+
+
+class _ErrorLimitReached(Exception):
+    pass
+
+
+class _ErrorList(list):
+    """List of error messages that stops validation once it holds `limit` messages"""
+    def __init__(self, limit: int = None):
+        super().__init__()
+        self.limit = limit
+
+    def append(self, message: str):
+        super().append(message)
+        if self.limit is not None and len(self) >= self.limit:
+            raise _ErrorLimitReached
+
+
+def _format_path(parent, key) -> str:
+    """
+    Build the display path of a value. Paths are passed down as the parent's
+    (parent, key) pair plus the value's own key, so the string is only built
+    when an error is recorded.
+    """
+    parts = []
+    while parent is not None:
+        parts.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+        parent, key = parent
+    parts.append(str(key))
+    return "".join(reversed(parts))
+
+
+# Compiled validators of the most recently used schemas by the id of their
+# schema, which is kept alive alongside until it is evicted
+SCHEMA_CACHE_SIZE = 64
+_compiled_schemas = OrderedDict()
+_compiled_schemas_lock = threading.Lock()
+
+
+def compile_schema(schema: dict, cache: bool = True):
+    """
+    Compile a schema into a validator function, reusing the validator of a
+    schema object that was compiled before.
+
+    Args:
+        schema (dict): The schema to compile.
+        cache (bool): Whether to look up and store the validator in the cache of
+            recently compiled schemas; False always compiles afresh.
+
+    Returns:
+        Callable: check(value, parent, key, errors), which appends an error
+            message to the `errors` list for every violation found in the value.
+            `key` is the value's key in its parent (the root's display name at
+            the top level), and `parent` the parent's own (parent, key) pair, or
+            None at the top level.
+    """
+    if not cache:
+        return _compile(schema)
+    with _compiled_schemas_lock:
+        cached = _compiled_schemas.get(id(schema))
+        if cached is not None and cached[0] is schema:
+            _compiled_schemas.move_to_end(id(schema))
+            return cached[1]
+    check = _compile(schema)
+    with _compiled_schemas_lock:
+        _compiled_schemas[id(schema)] = (schema, check)
+        _compiled_schemas.move_to_end(id(schema))
+        if len(_compiled_schemas) > SCHEMA_CACHE_SIZE:
+            _compiled_schemas.popitem(last=False)
+    return check
+
+
+def _compile(schema: dict):
+    if 'type' not in schema:
+        return lambda value, parent, key, errors: None
+    if isinstance(schema['type'], list):
+        return _compile_union(schema)
+    compiler = _TYPE_COMPILERS.get(schema['type'])
+    if compiler is None:
+        message = f"Unsupported type '{schema['type']}'"
+        return lambda value, parent, key, errors: errors.append(f"{_format_path(parent, key)}: {message}")
+    return compiler(schema)
+
+
+def _compile_union(schema: dict):
+    """Compile a schema whose type is a list, the value is checked as the first type it matches"""
+    names = schema['type']
+    members = tuple(
+        (_SCHEMA_TYPES.get(name, ()), _compile({**schema, 'type': name})) for name in names
+    )
+    expected = " or ".join(names)
+
+    def check(value, parent, key, errors):
+        for python_type, check_member in members:
+            if isinstance(value, python_type):
+                check_member(value, parent, key, errors)
+                return
+        errors.append(f"{_format_path(parent, key)}: Expected {expected}, got {type(value).__name__}")
+    return check
+
+
+def _accepts_any_string(schema: dict) -> bool:
+    """Return whether every string is valid against the schema"""
+    types = schema.get('type')
+    if isinstance(types, str):
+        types = [types]
+    return types is not None and 'string' in types and 'enum' not in schema and 'pattern' not in schema
+
+
+def _compile_object(schema: dict):
+    required = tuple(schema.get('required', []))
+    properties = tuple((name, _compile(sub_schema)) for name, sub_schema in schema.get('properties', {}).items())
+    known = frozenset(schema.get('properties', {}))
+    check_additional = None
+    if isinstance(schema.get('additionalProperties'), dict):
+        check_additional = _compile(schema['additionalProperties'])
+
+    def check(value, parent, key, errors):
+        if not isinstance(value, dict):
+            errors.append(f"{_format_path(parent, key)}: Expected object, got {type(value).__name__}")
+            return
+        for name in required:
+            if name not in value:
+                errors.append(f"{_format_path(parent, key)}: Missing required field '{name}'")
+        node = (parent, key)
+        for name, check_property in properties:
+            if name in value:
+                check_property(value[name], node, name, errors)
+        if check_additional is not None:
+            for name, item in value.items():
+                if name not in known:
+                    check_additional(item, node, name, errors)
+    return check
+
+
+def _compile_array(schema: dict):
+    min_items = schema.get('minItems')
+    max_items = schema.get('maxItems')
+    check_item = _compile(schema['items']) if schema.get('items') else None
+    string_items = check_item is not None and _accepts_any_string(schema['items'])
+
+    def check(value, parent, key, errors):
+        if not isinstance(value, list):
+            errors.append(f"{_format_path(parent, key)}: Expected array, got {type(value).__name__}")
+            return
+        if min_items is not None and len(value) < min_items:
+            errors.append(f"{_format_path(parent, key)}: Array too short ({len(value)} items)")
+        if max_items is not None and len(value) > max_items:
+            errors.append(f"{_format_path(parent, key)}: Array too long ({len(value)} items)")
+        node = (parent, key)
+        if string_items:
+            # Strings are valid items, so only the positions of other values are visited
+            types = list(map(type, value))
+            if types.count(str) == len(types):
+                return
+            for i in compress(range(len(types)), map(operator.is_not, types, repeat(str))):
+                check_item(value[i], node, i, errors)
+        elif check_item is not None:
+            for i, item in enumerate(value):
+                check_item(item, node, i, errors)
+    return check
+
+
+def _compile_string(schema: dict):
+    enum = None
+    if 'enum' in schema:
+        try:
+            enum = frozenset(schema['enum'])
+        except TypeError:
+            enum = tuple(schema['enum'])
+    match = re.compile(schema['pattern']).match if 'pattern' in schema else None
+
+    def check(value, parent, key, errors):
+        if not isinstance(value, str):
+            errors.append(f"{_format_path(parent, key)}: Expected string, got {type(value).__name__}")
+            return
+        if enum is not None and value not in enum:
+            errors.append(f"{_format_path(parent, key)}: Invalid enum value '{value}'")
+        if match is not None and not match(value):
+            errors.append(f"{_format_path(parent, key)}: Invalid pattern for value '{value}'")
+    return check
+
+
+def _compile_number(expected: type, name: str):
+    def compiler(schema: dict):
+        minimum = schema.get('minimum')
+
+        def check(value, parent, key, errors):
+            if not isinstance(value, expected):
+                errors.append(f"{_format_path(parent, key)}: Expected {name}, got {type(value).__name__}")
+            elif minimum is not None and value < minimum:
+                errors.append(f"{_format_path(parent, key)}: Value {value} is less than the minimum of {minimum}")
+        return check
+    return compiler
+
+
+def _compile_instance_check(expected: type, name: str):
+    def compiler(schema: dict):
+        def check(value, parent, key, errors):
+            if not isinstance(value, expected):
+                errors.append(f"{_format_path(parent, key)}: Expected {name}, got {type(value).__name__}")
+        return check
+    return compiler
+
+
+_TYPE_COMPILERS = {
+    'object': _compile_object,
+    'array': _compile_array,
+    'string': _compile_string,
+    'integer': _compile_number(int, "integer"),
+    'number': _compile_number((int, float), "number"),
+    'boolean': _compile_instance_check(bool, "boolean"),
+}
 
 
 class JSONValidator:
-    def __init__(self, schema):
+    def __init__(self, schema, max_errors: int = MAX_VALIDATION_ERRORS, fail_fast: bool = False):
+        """
+        Args:
+            schema (dict): The schema to validate against.
+            max_errors (int): Stop validating once this many errors have been
+                found, or None to report every error.
+            fail_fast (bool): Stop validating at the first error.
+        """
         self.schema = schema
+        self.max_errors = 1 if fail_fast else max_errors
+        self.fail_fast = fail_fast
         self.errors = []
+        self._check = compile_schema(schema)
+        self._path_checks = {}
+        self._path_results = {}
 
-    def _validate(self, value, schema, path="root"):
-        if 'type' in schema:
-            if schema['type'] == 'object':
-                if not isinstance(value, dict):
-                    self.errors.append(f"{path}: Expected object, got {type(value).__name__}")
-                    return False
-                
-                # Check required fields
-                required = schema.get('required', [])
-                for key in required:
-                    if key not in value:
-                        self.errors.append(f"{path}: Missing required field '{key}'")
-                
-                # Check properties
-                properties = schema.get('properties', {})
-                for key, sub_schema in properties.items():
-                    if key in value:
-                        self._validate(value[key], sub_schema, path=f"{path}.{key}")
-
-            elif schema['type'] == 'array':
-                if not isinstance(value, list):
-                    self.errors.append(f"{path}: Expected array, got {type(value).__name__}")
-                    return False
-                
-                if 'minItems' in schema and len(value) < schema['minItems']:
-                    self.errors.append(f"{path}: Array too short ({len(value)} items)")
-
-                if 'maxItems' in schema and len(value) > schema['maxItems']:
-                    self.errors.append(f"{path}: Array too long ({len(value)} items)")
-
-                item_schema = schema.get('items')
-                if item_schema:
-                    for i, item in enumerate(value):
-                        self._validate(item, item_schema, path=f"{path}[{i}]")
-
-            elif schema['type'] == 'string':
-                if not isinstance(value, str):
-                    self.errors.append(f"{path}: Expected string, got {type(value).__name__}")
-                
-                if 'enum' in schema and value not in schema['enum']:
-                    self.errors.append(f"{path}: Invalid enum value '{value}'")
-                
-                if 'pattern' in schema and not re.match(schema['pattern'], value):
-                    self.errors.append(f"{path}: Invalid pattern for value '{value}'")
-
-            elif schema['type'] == 'integer':
-                if not isinstance(value, int):
-                    self.errors.append(f"{path}: Expected integer, got {type(value).__name__}")
-
-            elif schema['type'] == 'boolean':
-                if not isinstance(value, bool):
-                    self.errors.append(f"{path}: Expected boolean, got {type(value).__name__}")
+    def _run(self, check, value, parent, key) -> list:
+        errors = _ErrorList(self.max_errors)
+        try:
+            check(value, parent, key, errors)
+        except _ErrorLimitReached:
+            if not self.fail_fast:
+                return [*errors, f"Validation stopped after {len(errors)} errors"]
+        return list(errors)
 
-            else:
-                self.errors.append(f"{path}: Unsupported type '{schema['type']}'")
+    def _path_check(self, keys: tuple):
+        """Return the compiled validator of the sub-schema at a path, or None if the path has no schema"""
+        if keys not in self._path_checks:
+            schema = self.schema
+            for key in keys:
+                types = schema.get('type')
+                if isinstance(types, str):
+                    types = [types]
+                types = types or []
+                if 'object' in types and isinstance(key, str):
+                    schema = schema.get('properties', {}).get(key, schema.get('additionalProperties'))
+                elif 'array' in types and isinstance(key, int):
+                    schema = schema.get('items')
+                else:
+                    schema = None
+                if not isinstance(schema, dict):
+                    schema = None
+                if schema is None:
+                    break
+            self._path_checks[keys] = compile_schema(schema) if schema is not None else None
+        return self._path_checks[keys]
 
-        return not bool(self.errors)
-    
-    def validate(self, data):
-        self.errors = []  # Reset errors
-        if not self._validate(data, self.schema):
+    def validate_path(self, keys, value) -> list:
+        """
+        Validate a single value against the part of the schema at its path,
+        without validating the rest of the document. The result is cached
+        per path, and reused while the value at that path stays equal.
+
+        Args:
+            keys (str | list | tuple): The path of the value, as a dot-separated
+                string or a sequence of keys (integers for array items).
+            value (any): The value to validate.
+
+        Returns:
+            list: The error messages, empty if the value is valid.
+        """
+        keys = tuple(keys.split('.')) if isinstance(keys, str) else tuple(keys)
+        cached = self._path_results.get(keys)
+        if cached is not None and type(cached[0]) is type(value) and cached[0] == value:
+            return cached[1]
+
+        errors = []
+        check = self._path_check(keys)
+        if check is not None:
+            parent, key = None, "root"
+            for name in keys:
+                parent, key = (parent, key), name
+            errors = self._run(check, value, parent, key)
+        self._path_results[keys] = (value, errors)
+        return errors
+
+    def validate(self, data, path="root"):
+        self.errors = self._run(self._check, data, None, path)
+        if self.errors:
             error_message = "\n".join(self.errors)
             raise ValidationError(f"Configuration Validation failed:\n{error_message}")
         return True
@@ -187,6 +893,11 @@ def custom_json_dump(data, **kwargs):
     inner_indent = ' ' * (indent * 2) if indent is not None else ''
 
     for key, value in data.items():
+        # External list sources are shown as a single line
+        if isinstance(value, dict):
+            result.append(f'{outer_indent}{json.dumps(key, **kwargs)}: {json.dumps(value, ensure_ascii=kwargs.get("ensure_ascii", True))},')
+            continue
+
         # Add key with item count
         result.append(f'{outer_indent}{json.dumps(key, **kwargs)} ({len(value)} items): [')
         for item in value:
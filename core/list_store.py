@@ -0,0 +1,347 @@
+"""
+List store backends shared by the generator and the editor.
+
+"json" keeps the lists in lists.json and reads them through the compiled list
+file. "sqlite" keeps them in an SQLite database, where items are indexed by
+list and position so that single items can be read without loading the list.
+Positions are kept dense (the item at position i is item i), so appending an
+item only writes that item, but inserting or deleting any other item
+renumbers every later item of the list in one UPDATE, at a cost proportional
+to the rest of the list. The editor appends new items, so only its deletions
+pay this.
+
+Every edit of a list also gives it a new random revision, which identifies
+the list's contents (e.g. for sequential state files) without reading them.
+"""
+from __future__ import annotations
+from array import array
+import json
+import sqlite3
+import threading
+
+from core.__info__ import LISTS_SCHEMA
+from core.compiled_lists import CompiledLists
+from core.data import JSONHandler, JSONValidator
+from core.lists import (
+    CompactList, ItemSequence, TagIndex, entry_tags, entry_text, filter_entries
+)
+from core.sources import ExternalSource
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL DEFAULT 0,
+    source TEXT,
+    revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    list_id INTEGER NOT NULL REFERENCES lists (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    weight REAL,
+    tags TEXT
+);
+CREATE INDEX IF NOT EXISTS items_by_position ON items (list_id, position);
+"""
+
+# SQL expression for a new random 32-bit list revision
+NEW_REVISION = "abs(random()) % 4294967296"
+
+
+def open_list_store(backend: str, config_dir: str):
+    """
+    Open the list store for the configured backend.
+
+    Args:
+        backend (str): "json" or "sqlite".
+        config_dir (str): The directory holding lists.json / lists.db.
+
+    Raises:
+        ValidationError: If lists.json does not match LISTS_SCHEMA.
+    """
+    json_file = f"{config_dir}/lists.json"
+    if backend == "sqlite":
+        store = SQLiteListStore(f"{config_dir}/lists.db")
+        if not store.keys():
+            # Seed a new database from the existing lists.json
+            lists = JSONHandler(json_file).json_data
+            JSONValidator(LISTS_SCHEMA).validate(lists)
+            store.import_lists(lists)
+        return store
+    return CompiledLists.open(json_file, f"{config_dir}/lists.bin")
+
+
+class StoredList(ItemSequence):
+    """A list read item by item from an SQLite list store."""
+    def __init__(self, store: SQLiteListStore, list_id: int, size: int, weights: array = None, revision: int = None):
+        self.store = store
+        self.list_id = list_id
+        self.size = size
+        self.weights = weights
+        self.revision = revision
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("StoredList index out of range")
+        return self.store.item_text(self.list_id, index)
+
+    def __iter__(self):
+        yield from self.store.iter_texts(self.list_id)
+
+    def subset(self, indices) -> CompactList:
+        return CompactList.from_entries(self.store.entries_at(self.list_id, indices))
+
+    def fingerprint(self):
+        return self.revision
+
+
+class SQLiteListStore:
+    def __init__(self, db_file: str):
+        self.file_name = db_file
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        if "revision" not in {column[1] for column in self._conn.execute("PRAGMA table_info(lists)")}:
+            # Databases created before list revisions were recorded
+            self._conn.execute("ALTER TABLE lists ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        self.tag_indexes = {}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _list_row(self, list_name: str):
+        rows = self._query("SELECT id, size, source FROM lists WHERE name = ?", (list_name,))
+        return rows[0] if rows else None
+
+    # ---- Reading ----
+
+    def keys(self) -> list:
+        return [name for (name,) in self._query("SELECT name FROM lists ORDER BY id")]
+
+    def get(self, list_name: str, default=None) -> StoredList:
+        """Return a list whose items are read from the database on access"""
+        rows = self._query("SELECT id, size, source, revision FROM lists WHERE name = ?", (list_name,))
+        if not rows or rows[0][2] is not None:
+            return default
+        list_id, size, _, revision = rows[0]
+
+        weights = None
+        if self._query("SELECT 1 FROM items WHERE list_id = ? AND weight IS NOT NULL LIMIT 1", (list_id,)):
+            weights = array("d", (
+                1 if weight is None else weight for (weight,) in self._query(
+                    "SELECT weight FROM items WHERE list_id = ? ORDER BY position", (list_id,)
+                )
+            ))
+        return StoredList(self, list_id, size, weights, revision)
+
+    def item_text(self, list_id: int, position: int) -> str:
+        rows = self._query("SELECT text FROM items WHERE list_id = ? AND position = ?", (list_id, position))
+        if not rows:
+            raise IndexError(f"No item at position {position}")
+        return rows[0][0]
+
+    def iter_texts(self, list_id: int):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM items WHERE list_id = ? ORDER BY position", (list_id,)
+            ).fetchall()
+        for (text,) in rows:
+            yield text
+
+    def entries_at(self, list_id: int, positions) -> list:
+        """Return the entries at the given positions, in the given order"""
+        entries = {}
+        positions = list(positions)
+        for start in range(0, len(positions), 500):
+            chunk = positions[start:start + 500]
+            rows = self._query(
+                f"SELECT position, text, weight, tags FROM items WHERE list_id = ? "
+                f"AND position IN ({', '.join('?' * len(chunk))})", (list_id, *chunk)
+            )
+            entries.update((row[0], self._to_entry(*row[1:])) for row in rows)
+        return [entries[position] for position in positions]
+
+    def entries(self, list_name: str) -> list:
+        """Return every entry of a list, in the lists.json form"""
+        row = self._list_row(list_name)
+        if row is None:
+            return []
+        return [
+            self._to_entry(*item) for item in self._query(
+                "SELECT text, weight, tags FROM items WHERE list_id = ? ORDER BY position", (row[0],)
+            )
+        ]
+
+    def to_dict(self) -> dict:
+        """Return all lists in the lists.json form"""
+        data = {}
+        for list_id, name, source in self._query("SELECT id, name, source FROM lists ORDER BY id"):
+            data[name] = json.loads(source) if source is not None else self.entries(name)
+        return data
+
+    @staticmethod
+    def _to_entry(text, weight, tags):
+        if weight is None and tags is None:
+            return text
+        entry = {"text": text}
+        if weight is not None:
+            entry["weight"] = weight
+        if tags is not None:
+            entry["tags"] = json.loads(tags)
+        return entry
+
+    def source(self, list_name: str, base_dir: str = ".") -> ExternalSource:
+        """Return the external source of a list, or None if its items are stored in the database"""
+        row = self._list_row(list_name)
+        if row is None or row[2] is None:
+            return None
+        return ExternalSource.from_spec(json.loads(row[2]), base_dir)
+
+    def tag_index(self, list_name: str) -> TagIndex:
+        if list_name not in self.tag_indexes:
+            list_id, size, _ = self._list_row(list_name)
+            positions = {}
+            for position, tags in self._query(
+                "SELECT position, tags FROM items WHERE list_id = ? AND tags IS NOT NULL", (list_id,)
+            ):
+                for tag in json.loads(tags):
+                    positions.setdefault(tag, []).append(position)
+            index = TagIndex.from_bitmaps(size, {})
+            index.bitmaps.update((tag, index._to_bitmap(ids)) for tag, ids in positions.items())
+            self.tag_indexes[list_name] = index
+        return self.tag_indexes[list_name]
+
+    def filter(self, list_name: str, expression: str):
+        """Return the items of a list matching a tag filter, see parse_tag_filter()"""
+        return filter_entries(self.get(list_name, []), expression, lambda: self.tag_index(list_name))
+
+    # ---- Editing ----
+
+    def create_list(self, list_name: str, source: dict = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO lists (name, source, revision) VALUES (?, ?, {NEW_REVISION})",
+                (list_name, json.dumps(source) if source is not None else None)
+            )
+
+    def remove_list(self, list_name: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM lists WHERE name = ?", (list_name,))
+        self.tag_indexes.pop(list_name, None)
+
+    def insert_item(self, list_name: str, entry, position: int = None):
+        """Insert an entry at a position (default: the end of the list)"""
+        with self._lock, self._conn:
+            self._insert_item(list_name, entry, position)
+
+    def _insert_item(self, list_name, entry, position=None):
+        list_id, size, _ = self._list_row(list_name)
+        position = size if position is None else max(0, min(position, size))
+        if position < size:
+            # Renumbers every later item, see the module docstring
+            self._conn.execute(
+                "UPDATE items SET position = position + 1 WHERE list_id = ? AND position >= ?",
+                (list_id, position)
+            )
+        tags = entry_tags(entry)
+        self._conn.execute(
+            "INSERT INTO items (list_id, position, text, weight, tags) VALUES (?, ?, ?, ?, ?)", (
+                list_id, position, entry_text(entry),
+                entry.get("weight") if isinstance(entry, dict) else None,
+                json.dumps(tags) if tags else None
+            )
+        )
+        self._conn.execute(f"UPDATE lists SET size = size + 1, revision = {NEW_REVISION} WHERE id = ?", (list_id,))
+        self.tag_indexes.pop(list_name, None)
+
+    def delete_item(self, list_name: str, position: int):
+        with self._lock, self._conn:
+            self._delete_item(list_name, position)
+
+    def _delete_item(self, list_name, position):
+        list_id, _, _ = self._list_row(list_name)
+        if self._conn.execute(
+            "DELETE FROM items WHERE list_id = ? AND position = ?", (list_id, position)
+        ).rowcount:
+            # Renumbers every later item, see the module docstring
+            self._conn.execute(
+                "UPDATE items SET position = position - 1 WHERE list_id = ? AND position > ?",
+                (list_id, position)
+            )
+            self._conn.execute(f"UPDATE lists SET size = size - 1, revision = {NEW_REVISION} WHERE id = ?", (list_id,))
+        self.tag_indexes.pop(list_name, None)
+
+    def _delete_text(self, list_name, text):
+        list_id, _, _ = self._list_row(list_name)
+        rows = self._conn.execute(
+            "SELECT position FROM items WHERE list_id = ? AND text = ? ORDER BY position LIMIT 1",
+            (list_id, text)
+        ).fetchall()
+        if rows:
+            self._delete_item(list_name, rows[0][0])
+
+    def apply(self, operations):
+        """
+        Apply editor operations in a single transaction.
+
+        Args:
+            operations (list): Tuples of ("create", list_name), ("remove", list_name),
+                ("insert", list_name, entry) or ("delete", list_name, item_text).
+        """
+        with self._lock, self._conn:
+            for operation, list_name, *args in operations:
+                if operation == "create":
+                    self._conn.execute(
+                        f"INSERT OR IGNORE INTO lists (name, revision) VALUES (?, {NEW_REVISION})", (list_name,)
+                    )
+                elif operation == "remove":
+                    self._conn.execute("DELETE FROM lists WHERE name = ?", (list_name,))
+                    self.tag_indexes.pop(list_name, None)
+                elif operation == "insert":
+                    self._insert_item(list_name, args[0])
+                elif operation == "delete":
+                    self._delete_text(list_name, args[0])
+                else:
+                    raise ValueError(f"Unknown list operation: {operation}")
+
+    def import_lists(self, data: dict):
+        """Add the lists of a lists.json document in a single transaction"""
+        with self._lock, self._conn:
+            for list_name, entries in data.items():
+                if isinstance(entries, dict):
+                    self._conn.execute(
+                        f"INSERT INTO lists (name, source, revision) VALUES (?, ?, {NEW_REVISION})",
+                        (list_name, json.dumps(entries))
+                    )
+                    continue
+                list_id = self._conn.execute(
+                    f"INSERT INTO lists (name, size, revision) VALUES (?, ?, {NEW_REVISION})",
+                    (list_name, len(entries))
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO items (list_id, position, text, weight, tags) VALUES (?, ?, ?, ?, ?)", (
+                        (
+                            list_id, position, entry_text(entry),
+                            entry.get("weight") if isinstance(entry, dict) else None,
+                            json.dumps(entry_tags(entry)) if entry_tags(entry) else None
+                        )
+                        for position, entry in enumerate(entries)
+                    )
+                )
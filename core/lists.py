@@ -0,0 +1,241 @@
+"""
+Helpers for interpreting the entries stored in lists.json.
+
+An entry is either a plain string, or an object of the form
+{"text": "...", "weight": 3, "tags": ["dept:eng"]} for items that carry
+extra attributes.
+"""
+from __future__ import annotations
+from abc import abstractmethod
+from array import array
+from collections.abc import Sequence
+import zlib
+
+
+def entry_text(entry) -> str:
+    """Return the display text of a list entry"""
+    if isinstance(entry, dict):
+        return entry.get("text", "")
+    return entry
+
+
+def entry_weight(entry) -> float:
+    """Return the draw weight of a list entry, defaulting to 1"""
+    if isinstance(entry, dict):
+        return entry.get("weight", 1)
+    return 1
+
+
+def split_entries(entries) -> tuple[list, list | None]:
+    """
+    Split list entries into their display texts and draw weights.
+
+    Returns:
+        tuple: The list of texts, and the list of weights or None when every
+            entry has the default weight. The weights of an ItemSequence are
+            returned as they are stored (an array or memoryview of doubles).
+    """
+    if isinstance(entries, ItemSequence):
+        return entries, entries.weights
+
+    texts = [entry_text(entry) for entry in entries]
+    weights = None
+    if any(isinstance(entry, dict) and "weight" in entry for entry in entries):
+        weights = [entry_weight(entry) for entry in entries]
+    return texts, weights
+
+
+def entry_tags(entry) -> list:
+    """Return the tags of a list entry"""
+    if isinstance(entry, dict):
+        return entry.get("tags", [])
+    return []
+
+
+def parse_tag_filter(expression: str) -> tuple[list, list]:
+    """
+    Parse a tag filter such as "dept:eng -absent" into the tags an item must
+    have and the tags it must not have (prefixed with "-" or "!").
+    """
+    required, excluded = [], []
+    for token in expression.split():
+        if token[0] in "-!" and len(token) > 1:
+            excluded.append(token[1:])
+        else:
+            required.append(token)
+    return required, excluded
+
+
+class TagIndex:
+    """
+    Inverted index from tag to the set of entry positions carrying it. Each set
+    is stored as an integer bitmap, so filters are evaluated with bitwise
+    intersections instead of rescanning the entries.
+    """
+    def __init__(self, entries):
+        self.size = len(entries)
+        positions = {}
+        for i, entry in enumerate(entries):
+            for tag in entry_tags(entry):
+                positions.setdefault(tag, []).append(i)
+
+        self.bitmaps = {tag: self._to_bitmap(ids) for tag, ids in positions.items()}
+
+    @classmethod
+    def from_bitmaps(cls, size: int, bitmaps: dict) -> TagIndex:
+        """Create an index from precomputed tag bitmaps"""
+        index = cls.__new__(cls)
+        index.size = size
+        index.bitmaps = bitmaps
+        return index
+
+    def _to_bitmap(self, ids) -> int:
+        bits = bytearray((self.size + 7) // 8)
+        for i in ids:
+            bits[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(bits, "little")
+
+    def tags(self) -> list:
+        return sorted(self.bitmaps)
+
+    def select(self, required=(), excluded=()) -> int:
+        """
+        Return the bitmap of entries carrying every required tag and none of
+        the excluded tags.
+        """
+        bitmap = (1 << self.size) - 1
+        for tag in required:
+            bitmap &= self.bitmaps.get(tag, 0)
+        for tag in excluded:
+            bitmap &= ~self.bitmaps.get(tag, 0)
+        return bitmap
+
+    def indices(self, bitmap: int) -> list:
+        """Return the entry positions set in a bitmap, in ascending order"""
+        result = []
+        for byte_index, byte in enumerate(bitmap.to_bytes((self.size + 7) // 8, "little")):
+            if byte:
+                base = byte_index << 3
+                result.extend(base + bit for bit in _BYTE_BITS[byte])
+        return result
+
+
+# Positions of the set bits in every possible byte value
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def offset_typecode(size: int) -> str:
+    """Return the narrowest array typecode able to hold byte offsets up to `size`"""
+    return "I" if size <= 0xFFFFFFFF else "Q"
+
+
+class ItemSequence(Sequence):
+    """
+    Base class for read-only item sequences that are not held as Python
+    lists. Indexing returns item texts, and `weights` holds the per-item
+    weights or None.
+    """
+    weights = None
+
+    @abstractmethod
+    def subset(self, indices) -> CompactList:
+        """Return a compact list holding only the items at the given positions"""
+
+    def fingerprint(self):
+        """
+        Return a 32-bit checksum identifying the items, if the sequence can
+        provide one without reading every item, otherwise None.
+        """
+        return None
+
+
+class CompactList(ItemSequence):
+    """
+    Read-only list of entry texts stored as one UTF-8 blob and a table of
+    offsets into it. Only the items that are accessed are decoded, and each
+    item costs a few bytes of offset rather than a full Python string object.
+    """
+    def __init__(self, blob, offsets: array, weights: array = None):
+        """
+        Args:
+            blob (bytes | memoryview): The concatenated UTF-8 encoded texts.
+            offsets (array): len(items) + 1 offsets, item i spans offsets[i]:offsets[i + 1].
+            weights (array): Optional per-item weights.
+        """
+        self.blob = blob
+        self.offsets = offsets
+        self.weights = weights
+
+    @classmethod
+    def from_entries(cls, entries) -> CompactList:
+        """Build a compact list from list entries (plain strings or objects)"""
+        blob = bytearray()
+        offsets = [0]
+        for entry in entries:
+            blob += entry_text(entry).encode("utf-8")
+            offsets.append(len(blob))
+
+        _, weights = split_entries(entries)
+        return cls(
+            bytes(blob),
+            array(offset_typecode(len(blob)), offsets),
+            array("d", weights) if weights is not None else None
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("CompactList index out of range")
+        return str(self.blob[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+    def subset(self, indices) -> CompactList:
+        """Return a new compact list holding only the items at the given positions"""
+        blob = bytearray()
+        offsets = [0]
+        for i in indices:
+            blob += self.blob[self.offsets[i]:self.offsets[i + 1]]
+            offsets.append(len(blob))
+
+        weights = None
+        if self.weights is not None:
+            weights = array("d", (self.weights[i] for i in indices))
+        return CompactList(bytes(blob), array(offset_typecode(len(blob)), offsets), weights)
+
+    def fingerprint(self) -> int:
+        # The blob and offsets identify the texts without decoding any of them
+        return zlib.crc32(self.offsets, zlib.crc32(self.blob))
+
+    @property
+    def nbytes(self) -> int:
+        """Return the memory used by the item data"""
+        size = len(self.blob) + len(self.offsets) * self.offsets.itemsize
+        if self.weights is not None:
+            size += len(self.weights) * self.weights.itemsize
+        return size
+
+
+def filter_entries(entries, expression: str, get_index):
+    """
+    Return the entries matching a tag filter.
+
+    Args:
+        entries (list | ItemSequence): The entries to filter.
+        expression (str): The filter, see parse_tag_filter().
+        get_index (Callable): Returns the TagIndex for the entries, only called
+            when the filter is not empty.
+    """
+    required, excluded = parse_tag_filter(expression)
+    if not required and not excluded:
+        return entries
+    index = get_index()
+    indices = index.indices(index.select(required, excluded))
+    if isinstance(entries, ItemSequence):
+        return entries.subset(indices)
+    return [entries[i] for i in indices]
+
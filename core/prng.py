@@ -0,0 +1,92 @@
+"""
+Seekable pseudo-random streams used by the selection engine.
+
+Outputs are produced by the SplitMix64 mixing function applied to a counter,
+so any position in the stream can be reached in O(1). Each draw reads from
+its own block of counters, which means draw number N can be reproduced by
+jumping straight to it, without replaying the N draws before it.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import random
+
+MASK_64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+DRAW_BLOCK_BITS = 32
+
+
+def derive_seed(seed: int, name: str) -> int:
+    """Derive an independent 64-bit seed for a named stream from a base seed"""
+    digest = hashlib.sha256(f"{seed}:{name}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+class SeededRandom(random.Random):
+    def __init__(self, seed: int = None):
+        self.seed_value = 0
+        self.draw_index = 0
+        self.counter = 0
+        super().__init__(seed)
+
+    def seed(self, a=None, version=2):
+        """
+        Reset the stream to the start of the given seed.
+
+        Args:
+            a (int | str | bytes | None): The seed, or None for a random seed.
+        """
+        if a is None:
+            a = int.from_bytes(os.urandom(8), "little")
+        elif isinstance(a, (str, bytes, bytearray)):
+            if isinstance(a, str):
+                a = a.encode("utf-8")
+            a = int.from_bytes(hashlib.sha256(a).digest()[:8], "little")
+        self.seed_value = int(a) & MASK_64
+        self.draw_index = 0
+        self.counter = 0
+        self.gauss_next = None
+
+    def begin_draw(self):
+        """Move the stream to the block of outputs reserved for the next draw."""
+        self.counter = self.draw_index << DRAW_BLOCK_BITS
+        self.draw_index += 1
+
+    def jump(self, draw_index: int):
+        """
+        Position the stream so that the next draw is draw number `draw_index`.
+
+        Args:
+            draw_index (int): The zero-based number of the draw to reproduce.
+        """
+        if draw_index < 0:
+            raise ValueError("Draw index must be non-negative")
+        self.draw_index = draw_index
+        self.counter = draw_index << DRAW_BLOCK_BITS
+
+    def _next64(self) -> int:
+        self.counter += 1
+        z = (self.seed_value + self.counter * GOLDEN_GAMMA) & MASK_64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+        return z ^ (z >> 31)
+
+    def random(self) -> float:
+        return (self._next64() >> 11) * (1.0 / (1 << 53))
+
+    def getrandbits(self, k: int) -> int:
+        if 0 < k <= 64:
+            return self._next64() >> (64 - k)
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        value = 0
+        for _ in range(-(-k // 64)):
+            value = (value << 64) | self._next64()
+        return value >> (-k % 64)
+
+    def getstate(self) -> tuple:
+        return (self.seed_value, self.draw_index, self.counter)
+
+    def setstate(self, state: tuple):
+        self.seed_value, self.draw_index, self.counter = state
+        self.gauss_next = None
@@ -0,0 +1,557 @@
+"""
+Headless selection engine used by the random generator.
+
+The engine owns the loaded list, the sequential cursor and the random source,
+so draws can be made (and measured) without a Tk display.
+"""
+from __future__ import annotations
+from array import array
+from enum import Enum
+import heapq
+import random
+
+from core.lists import ItemSequence, split_entries
+from core.prng import SeededRandom
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Batches at least this large are drawn with NumPy when it is available
+NUMPY_MIN_BATCH = 1000
+
+# Random spread (in picks) applied to fair-mode priorities, so that items
+# picked equally often are not returned in a fixed rotation
+FAIRNESS_JITTER = 1.5
+
+
+class DrawMode(Enum):
+    RANDOM = "random"
+    SEQUENTIAL = "sequential"
+    FAIR = "fair"
+
+
+class SelectionEngine:
+    def __init__(self, items=None, rng: random.Random = None):
+        self.rng = rng if rng is not None else SeededRandom()
+        self.items = []
+        self.order = array("I")
+        self.cursor = 0
+        self.weights = None
+        self.alias = None
+        self.repeat_window = 0
+        self._pool = None
+        self.pick_counts = None
+        self._fair_heap = None
+        self.state = None
+        self.load(items if items is not None else [])
+
+    def __len__(self):
+        return len(self.items)
+
+    def load(self, items, rng: random.Random = None):
+        """
+        Replace the loaded list and start a fresh sequential cycle.
+
+        Args:
+            items (Iterable): The list entries to draw from, either plain
+                strings or {"text": ..., "weight": ...} objects.
+            rng (random.Random): Optional random source owned by this list.
+
+        Raises:
+            ValueError: If the weights are invalid, see set_weights().
+        """
+        if not isinstance(items, (list, ItemSequence)):
+            items = list(items)
+        texts, weights = split_entries(items)
+        # Invalid weights raise here, before the loaded list is touched
+        self.set_weights(weights)
+        self.close_state()
+        if rng is not None:
+            self.rng = rng
+        self.items = texts
+        self.order = index_array(len(self.items))
+        self.cursor = 0
+        self._reset_recent()
+        self.pick_counts = None
+        self._fair_heap = None
+
+    def patch(self, items) -> tuple[int, int]:
+        """
+        Replace the loaded list with an edited version of it, keeping the
+        sequential cycle and fair-mode pick counts. Items that are still
+        present keep their place in the cycle, removed items are dropped and
+        added items join the part of the cycle that has not been drawn yet.
+
+        Args:
+            items (Iterable): The edited list entries, see load().
+
+        Returns:
+            tuple: The number of items added and removed.
+
+        Raises:
+            ValueError: If the weights are invalid, see set_weights().
+        """
+        if not isinstance(items, (list, ItemSequence)):
+            items = list(items)
+        texts, weights = split_entries(items)
+        mapping = match_indices(self.items, texts)
+
+        # Rebuild the cycle from the surviving items, then append the new ones
+        order = array(index_typecode(len(texts)))
+        cursor = 0
+        for position, old_index in enumerate(self.order):
+            new_index = mapping[old_index]
+            if new_index >= 0:
+                order.append(new_index)
+                if position < self.cursor:
+                    cursor += 1
+        kept = len(order)
+        if kept < len(texts):
+            present = bytearray(len(texts))
+            for new_index in order:
+                present[new_index] = 1
+            order.extend(i for i in range(len(texts)) if not present[i])
+
+        pick_counts = None
+        if self.pick_counts is not None:
+            pick_counts = array("I", [0]) * len(texts)
+            for old_index, new_index in enumerate(mapping):
+                if new_index >= 0:
+                    pick_counts[new_index] = self.pick_counts[old_index]
+
+        removed = len(self.items) - kept
+        self.set_weights(weights)
+        state = self.state
+        self.close_state()
+        self.items = texts
+        self.order = order
+        self.cursor = cursor
+        self._reset_recent()
+        self.pick_counts = pick_counts
+        self._fair_heap = None
+        if state is not None:
+            state.save(self.items, self.order, self.cursor, self.rng)
+            self.attach_state(state)
+        return len(texts) - kept, removed
+
+    def attach_state(self, state):
+        """
+        Resume the sequential cycle from a state file, and persist every
+        subsequent sequential draw to it.
+
+        Args:
+            state (SequentialStateFile): The state file for the loaded list.
+        """
+        self.close_state()
+        self.order, self.cursor = state.open(self.items, self.rng)
+        self.state = state
+
+    def detach_state(self):
+        """Stop persisting the sequential cycle, keeping its progress in memory."""
+        if self.state is not None:
+            self.order = array(self.order.format, self.order)
+            self.close_state()
+
+    def close_state(self):
+        """Release the state file; the sequential cycle must be reloaded afterwards."""
+        if self.state is not None:
+            self.state.close()
+            self.state = None
+
+    def set_weights(self, weights):
+        """
+        Set the per-item weights used by random draws. The alias table is only
+        rebuilt when the weights differ from the current ones: weight lists are
+        compared by value, stored weights (arrays and memoryviews of a compact
+        list) by identity, so they are never copied or scanned here.
+
+        Args:
+            weights (list | array | memoryview | None): One weight per item, or
+                None for uniform draws.
+
+        Raises:
+            ValueError: If a weight is negative or every weight is zero, in
+                which case the current weights are kept.
+        """
+        if weights is self.weights or (isinstance(weights, list) and weights == self.weights):
+            return
+        self.alias = AliasTable(weights) if weights is not None else None
+        self.weights = weights
+        self._fair_heap = None
+
+    def seek(self, draw_index: int):
+        """
+        Position a seeded random source so the next draw reproduces draw
+        number `draw_index`, without replaying the draws before it. Random and
+        weighted draws are reproduced exactly; modes that keep state between
+        draws (sequential, fair, no-repeat) also depend on the earlier draws.
+
+        Raises:
+            TypeError: If the engine's random source is not seekable.
+        """
+        if not isinstance(self.rng, SeededRandom):
+            raise TypeError("Seeking requires a SeededRandom random source")
+        self.rng.jump(draw_index)
+
+    def _begin_draw(self):
+        if isinstance(self.rng, SeededRandom):
+            self.rng.begin_draw()
+
+    def _end_draw(self):
+        # Every draw advances the random stream, so it is persisted after each
+        # one; otherwise a restart would replay the draws since the last record
+        if self.state is not None:
+            self.state.record(self.cursor, self.rng)
+
+    def set_repeat_window(self, size: int):
+        """
+        Prevent random draws from returning any of the last `size` items.
+
+        Recently drawn items are kept in a ring buffer and swapped to the tail
+        of an index pool, so each draw stays O(1) however large the window is.
+        The window is capped at one less than the list length, and does not
+        apply to weighted lists.
+
+        Args:
+            size (int): The number of previous draws to exclude, 0 to disable.
+        """
+        if size < 0:
+            raise ValueError("Repeat window must be non-negative")
+        self.repeat_window = size
+        self._reset_recent()
+
+    def _reset_recent(self):
+        size = len(self.items)
+        window = min(self.repeat_window, max(size - 1, 0))
+        if not window or self.alias is not None:
+            self._pool = None
+            return
+
+        self._pool = index_array(size)
+        self._pool_pos = index_array(size)
+        self._recent = index_array(window)
+        self._recent_count = 0
+        self._recent_head = 0
+
+    def _move_in_pool(self, index: int, position: int):
+        """Swap the given item index into the given position of the pool"""
+        pool, pool_pos = self._pool, self._pool_pos
+        current = pool_pos[index]
+        displaced = pool[position]
+        pool[current], pool_pos[displaced] = displaced, current
+        pool[position], pool_pos[index] = index, position
+
+    def _draw_excluding_recent(self) -> int:
+        """Return an item index not drawn within the repeat window"""
+        size = len(self._pool)
+        window = len(self._recent)
+        head = self._recent_head
+
+        # The pool's tail holds the excluded items, draw from everything before it
+        excluded = self._recent_count
+        boundary = size - excluded - 1
+        index = self._pool[self.rng.randrange(boundary + 1)]
+        self._move_in_pool(index, boundary)
+
+        # Release the oldest item back into the pool once the window is full
+        if excluded == window:
+            self._move_in_pool(self._recent[head], boundary)
+        else:
+            self._recent_count += 1
+
+        self._recent[head] = index
+        self._recent_head = (head + 1) % window
+        return index
+
+    def shuffle(self):
+        """Discard the current cycle and restart from a freshly shuffled order."""
+        self._begin_draw()
+        self.rng.shuffle(self.order)
+        self.cursor = 0
+        self._end_draw()
+
+    def random(self):
+        """
+        Return a randomly chosen item, independent of previous draws. Items
+        are chosen in proportion to their weights when the list defines any.
+
+        Raises:
+            IndexError: If no items are loaded.
+        """
+        self._begin_draw()
+        if self.alias is not None:
+            item = self.items[self.alias.sample(self.rng)]
+        elif self._pool is not None:
+            item = self.items[self._draw_excluding_recent()]
+        else:
+            item = self.rng.choice(self.items)
+        self._end_draw()
+        return item
+
+    def sequential(self):
+        """
+        Return the next item of the current cycle, so that every item is
+        returned once before any item repeats.
+
+        The cycle is shuffled lazily: each call performs a single Fisher-Yates
+        swap on the index array, so a draw costs O(1) and wrapping around to a
+        new cycle needs no reshuffle.
+
+        Raises:
+            IndexError: If no items are loaded.
+        """
+        size = len(self.order)
+        if not size:
+            raise IndexError("Cannot choose from an empty sequence")
+        if self.cursor >= size:
+            self.cursor = 0
+
+        self._begin_draw()
+        order = self.order
+        i = self.cursor
+        j = self.rng.randrange(i, size)
+        order[i], order[j] = order[j], order[i]
+        self.cursor = i + 1
+        self._end_draw()
+        return self.items[order[i]]
+
+    def fair(self):
+        """
+        Return the item that is most overdue relative to its weight, so that
+        over a long session every item is picked roughly equally often.
+
+        Items are kept in a heap keyed on their pick count plus a random
+        jitter, which breaks ties randomly and avoids a fixed rotation. Each
+        draw costs O(log n).
+
+        Raises:
+            IndexError: If no items are loaded.
+        """
+        if not self.items:
+            raise IndexError("Cannot choose from an empty sequence")
+        self._begin_draw()
+        if self._fair_heap is None:
+            self._build_fair_heap()
+
+        index = self._fair_heap[0][1]
+        self.pick_counts[index] += 1
+        heapq.heapreplace(self._fair_heap, (self._fair_priority(index), index))
+        self._end_draw()
+        return self.items[index]
+
+    def _fair_priority(self, index: int) -> float:
+        priority = self.pick_counts[index] + self.rng.random() * FAIRNESS_JITTER
+        if self.weights is not None:
+            priority /= self.weights[index]
+        return priority
+
+    def _build_fair_heap(self):
+        if self.pick_counts is None:
+            self.pick_counts = array("I", [0]) * len(self.items)
+        self._fair_heap = [
+            (self._fair_priority(i), i) for i in range(len(self.items))
+            if self.weights is None or self.weights[i] > 0
+        ]
+        heapq.heapify(self._fair_heap)
+
+    def draw_many(self, k: int, replace: bool = False) -> list:
+        """
+        Draw k items in a single batch, honouring item weights.
+
+        Uniform draws without replacement use a partial Fisher-Yates shuffle
+        over a sparse swap map, so the cost is O(k) regardless of list size.
+        Large batches are vectorised with NumPy when it is installed.
+
+        Args:
+            k (int): The number of items to draw.
+            replace (bool): Whether the same item may be drawn more than once.
+
+        Raises:
+            IndexError: If items are requested from an empty list.
+            ValueError: If k is negative, or larger than the list without replacement.
+        """
+        size = len(self.items)
+        if k < 0:
+            raise ValueError("Sample size must be non-negative")
+        if k and not size:
+            raise IndexError("Cannot choose from an empty sequence")
+        if not replace and k > size:
+            raise ValueError(f"Cannot draw {k} items from a list of {size} without replacement")
+
+        self._begin_draw()
+        if numpy is not None and k >= NUMPY_MIN_BATCH:
+            indices = self._numpy_indices(k, replace)
+        elif replace:
+            if self.alias is not None:
+                indices = [self.alias.sample(self.rng) for _ in range(k)]
+            else:
+                indices = [self.rng.randrange(size) for _ in range(k)]
+        elif self.alias is not None:
+            indices = self._weighted_indices_without_replacement(k)
+        else:
+            indices = self._partial_shuffle_indices(k)
+        self._end_draw()
+        return [self.items[i] for i in indices]
+
+    def partition(self, groups: int, balance_weights: bool = True) -> list[list]:
+        """
+        Shuffle the list once and split it into near-equal groups.
+
+        Args:
+            groups (int): The number of groups to create.
+            balance_weights (bool): For weighted lists, assign items greedily
+                (heaviest first) to the group with the lowest total weight, so
+                that group weights rather than group sizes are balanced.
+
+        Returns:
+            list: One list of item texts per group.
+
+        Raises:
+            ValueError: If the number of groups is less than one.
+        """
+        if groups < 1:
+            raise ValueError("Number of groups must be at least 1")
+
+        self._begin_draw()
+        size = len(self.items)
+        order = index_array(size)
+        self.rng.shuffle(order)
+        self._end_draw()
+
+        if balance_weights and self.weights is not None:
+            members = [[] for _ in range(groups)]
+            weights = self.weights
+            heap = [(0, 0, group) for group in range(groups)]
+            for index in sorted(order, key=lambda i: weights[i], reverse=True):
+                total, count, group = heap[0]
+                members[group].append(self.items[index])
+                heapq.heapreplace(heap, (total + weights[index], count + 1, group))
+            return members
+
+        base, extra = divmod(size, groups)
+        members = []
+        start = 0
+        for group in range(groups):
+            end = start + base + (1 if group < extra else 0)
+            members.append([self.items[i] for i in order[start:end]])
+            start = end
+        return members
+
+    def _partial_shuffle_indices(self, k: int) -> list:
+        """Return k distinct indices using the first k steps of a Fisher-Yates shuffle"""
+        size = len(self.items)
+        swapped = {}
+        indices = []
+        for i in range(k):
+            j = self.rng.randrange(i, size)
+            indices.append(swapped.get(j, j))
+            swapped[j] = swapped.get(i, i)
+        return indices
+
+    def _weighted_indices_without_replacement(self, k: int) -> list:
+        """Return k distinct indices using Efraimidis-Spirakis weighted keys"""
+        keyed = [
+            (self.rng.random() ** (1.0 / weight), i)
+            for i, weight in enumerate(self.weights) if weight > 0
+        ]
+        if k > len(keyed):
+            raise ValueError(f"Cannot draw {k} items, only {len(keyed)} items have a non-zero weight")
+        return [i for _, i in heapq.nlargest(k, keyed)]
+
+    def _numpy_indices(self, k: int, replace: bool) -> list:
+        """Return k indices drawn by NumPy, seeded from the engine's random source"""
+        np_rng = numpy.random.default_rng(self.rng.getrandbits(64))
+        probabilities = None
+        if self.weights is not None:
+            probabilities = numpy.asarray(self.weights, dtype=float)
+            probabilities /= probabilities.sum()
+        return np_rng.choice(len(self.items), size=k, replace=replace, p=probabilities).tolist()
+
+    def draw(self, mode: DrawMode = DrawMode.RANDOM):
+        """Draw a single item using the given mode."""
+        if not isinstance(mode, DrawMode):
+            raise TypeError(f"Invalid draw mode: {mode}. Must be a DrawMode.")
+        return getattr(self, mode.value)()
+
+
+class AliasTable:
+    """
+    Vose's alias method: O(n) construction, O(1) weighted sampling.
+    """
+    def __init__(self, weights):
+        size = len(weights)
+        total = float(sum(weights))
+        if size == 0:
+            raise IndexError("Cannot build an alias table from an empty sequence")
+        if total <= 0 or any(weight < 0 for weight in weights):
+            raise ValueError("Weights must be non-negative and sum to a positive value")
+
+        self.prob = array("d", [0.0]) * size
+        self.alias = index_array(size)
+
+        scaled = array("d", (weight * size / total for weight in weights))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = (scaled[more] + scaled[less]) - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # Whatever remains is (up to rounding error) exactly full
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, rng: random.Random) -> int:
+        """Return an index drawn in proportion to its weight"""
+        u = rng.random() * len(self.prob)
+        i = int(u)
+        return i if (u - i) < self.prob[i] else self.alias[i]
+
+
+def index_typecode(size: int) -> str:
+    """Return the narrowest array typecode able to index a list of the given size"""
+    return "I" if size <= 0xFFFFFFFF else "Q"
+
+
+def match_indices(old_items, new_items) -> array:
+    """
+    Match the items of two versions of a list.
+
+    Unchanged leading and trailing items are matched by position, so a local
+    edit only hashes the items in between; those are matched by text, in order
+    for repeated texts.
+
+    Returns:
+        array: The new index of every old item, or -1 for removed items.
+    """
+    old_size, new_size = len(old_items), len(new_items)
+    prefix = 0
+    limit = min(old_size, new_size)
+    while prefix < limit and old_items[prefix] == new_items[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_items[old_size - suffix - 1] == new_items[new_size - suffix - 1]:
+        suffix += 1
+
+    mapping = array("q", range(prefix))
+    available = {}
+    for new_index in range(new_size - suffix - 1, prefix - 1, -1):
+        available.setdefault(new_items[new_index], []).append(new_index)
+    for old_index in range(prefix, old_size - suffix):
+        candidates = available.get(old_items[old_index])
+        mapping.append(candidates.pop() if candidates else -1)
+    mapping.extend(range(new_size - suffix, new_size))
+    return mapping
+
+
+def index_array(size: int) -> array:
+    """Return an array holding the indices 0..size-1"""
+    return array(index_typecode(size), range(size))
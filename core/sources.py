@@ -0,0 +1,184 @@
+"""
+External list sources: large text/CSV files that are sampled by streaming
+instead of being stored in lists.json.
+
+A list whose value in lists.json is an object is read from a file, e.g.
+    "nightly": {"source": "exports/pool.csv", "column": 1, "header": true,
+                "weight_column": 2, "sample_size": 1000}
+
+Files are read in large chunks. Uniform samples use reservoir sampling with
+geometric skips (Algorithm L), so only the lines that enter the reservoir are
+split out of a chunk. Weighted samples use A-ExpJ, the exponential-jump form
+of A-Res. Memory use is bounded by the chunk size and the sample size.
+
+The generator draws from a sample of sample_size items, and samples the file
+again (continuing the list's random stream) once as many items as the sample
+holds have been drawn, so every line of the file stays drawable.
+"""
+from __future__ import annotations
+import csv
+import heapq
+import io
+import math
+import os
+import random
+
+CHUNK_SIZE = 1 << 22
+
+
+def _open_uniform(rng: random.Random) -> float:
+    """Return a uniform value in the open interval (0, 1)"""
+    u = rng.random()
+    while u == 0.0:
+        u = rng.random()
+    return u
+
+
+def _jump(rng: random.Random, min_key: float) -> float:
+    """
+    Return the total weight to skip before the next item enters a weighted
+    reservoir, given the smallest key it holds (as a logarithm, see
+    ExternalSource._weighted_sample()).
+    """
+    if min_key == 0.0:
+        # Every key is as large as a key can be, so no later item can displace one
+        return math.inf
+    return math.log(_open_uniform(rng)) / min_key
+
+
+class ExternalSource:
+    def __init__(self, file_name, column=None, weight_column=None, delimiter=",",
+                 header=False, encoding="utf-8", sample_size=1000):
+        """
+        Args:
+            file_name (str): The text or CSV file to sample.
+            column (int | None): The CSV column holding the item text, or None to
+                use whole lines.
+            weight_column (int | None): The CSV column holding item weights.
+            delimiter (str): The CSV delimiter.
+            header (bool): Whether the first line is a header to be skipped.
+            encoding (str): The file encoding.
+            sample_size (int): The number of items drawn by sample() by default.
+        """
+        self.file_name = file_name
+        self.column = column
+        self.weight_column = weight_column
+        self.delimiter = delimiter
+        self.header = header
+        self.encoding = encoding
+        self.sample_size = sample_size
+
+    @classmethod
+    def from_spec(cls, spec: dict, base_dir: str = ".") -> ExternalSource:
+        """Create a source from its lists.json object, resolving relative paths against base_dir"""
+        return cls(
+            os.path.join(base_dir, spec["source"]),
+            column=spec.get("column"),
+            weight_column=spec.get("weight_column"),
+            delimiter=spec.get("delimiter", ","),
+            header=spec.get("header", False),
+            encoding=spec.get("encoding", "utf-8"),
+            sample_size=spec.get("sample_size", 1000)
+        )
+
+    def _blocks(self):
+        """Yield chunks of the file that each end on a line boundary"""
+        carry = b""
+        skip_header = self.header
+        with open(self.file_name, "rb") as source:
+            while chunk := source.read(CHUNK_SIZE):
+                block = carry + chunk
+                end = block.rfind(b"\n") + 1
+                block, carry = block[:end], block[end:]
+                if skip_header and end:
+                    block = block[block.index(b"\n") + 1:]
+                    skip_header = False
+                if block:
+                    yield block
+        if carry and not skip_header:
+            yield carry + b"\n"
+
+    def _item(self, line: bytes) -> str:
+        text = line.decode(self.encoding).rstrip("\r")
+        if self.column is None:
+            return text
+        row = next(csv.reader([text], delimiter=self.delimiter), [])
+        return row[self.column] if self.column < len(row) else ""
+
+    def sample(self, k: int = None, rng: random.Random = None) -> list:
+        """
+        Draw up to k items in a single pass over the file, weighted when the
+        source has a weight column.
+
+        Args:
+            k (int): The sample size, defaults to the source's sample_size.
+            rng (random.Random): The random source to use.
+        """
+        k = self.sample_size if k is None else k
+        rng = rng if rng is not None else random.Random()
+        if k <= 0:
+            return []
+        if self.weight_column is not None:
+            return self._weighted_sample(k, rng)
+        return self._uniform_sample(k, rng)
+
+    def _uniform_sample(self, k: int, rng: random.Random) -> list:
+        reservoir = []
+        threshold = 1.0
+        next_line = 0
+        seen = 0
+        for block in self._blocks():
+            line_count = block.count(b"\n")
+            lines = None
+            while next_line < seen + line_count:
+                if lines is None:
+                    lines = block.split(b"\n")
+                line = lines[next_line - seen]
+
+                if len(reservoir) < k:
+                    reservoir.append(line)
+                else:
+                    reservoir[rng.randrange(k)] = line
+                next_line += 1
+
+                # Once the reservoir is full, skip ahead to the next line that will replace an item
+                if len(reservoir) == k:
+                    threshold *= math.exp(math.log(_open_uniform(rng)) / k)
+                    if threshold < 1.0:
+                        next_line += int(math.log(_open_uniform(rng)) / math.log1p(-threshold))
+            seen += line_count
+        return [self._item(line) for line in reservoir]
+
+    def _weighted_sample(self, k: int, rng: random.Random) -> list:
+        # Keys are held as log(u ** (1 / weight)), which keeps them apart for
+        # large weights where u ** (1 / weight) itself would round to 1.0
+        heap = []
+        jump = None
+        for block in self._blocks():
+            rows = csv.reader(io.StringIO(block.decode(self.encoding), newline=""), delimiter=self.delimiter)
+            for row in rows:
+                try:
+                    weight = float(row[self.weight_column])
+                except (IndexError, ValueError):
+                    continue
+                if weight <= 0:
+                    continue
+
+                if len(heap) < k:
+                    heapq.heappush(heap, (math.log(_open_uniform(rng)) / weight, self._row_item(row)))
+                    if len(heap) == k:
+                        jump = _jump(rng, heap[0][0])
+                    continue
+
+                jump -= weight
+                if jump <= 0:
+                    threshold = math.exp(heap[0][0] * weight)
+                    key = math.log(threshold + (1.0 - threshold) * _open_uniform(rng)) / weight
+                    heapq.heapreplace(heap, (key, self._row_item(row)))
+                    jump = _jump(rng, heap[0][0])
+        return [item for _, item in heap]
+
+    def _row_item(self, row: list) -> str:
+        if self.column is None:
+            return self.delimiter.join(row)
+        return row[self.column] if self.column < len(row) else ""
@@ -0,0 +1,182 @@
+"""
+Binary sidecar files used to persist the sequential cycle of a list.
+
+Layout (header and random state are little-endian, the order is native):
+    header        magic, version, index size, list length, cursor, list fingerprint
+    random state  the seed, draw index and counter of the engine's random stream
+    order         the in-progress permutation as an array of item indices
+
+The file is memory-mapped, so the permutation is shared with the selection
+engine directly: each draw only touches the two swapped indices, the cursor
+and the random state, and resuming does not read the whole permutation.
+"""
+from __future__ import annotations
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+from core.lists import ItemSequence
+from core.prng import SeededRandom
+from core.selection import index_array, index_typecode
+
+MAGIC = b"RGSQ"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHHQQI")
+RNG_STATE = struct.Struct("<QQQ")
+CURSOR_OFFSET = 4 + 2 + 2 + 8
+RNG_OFFSET = HEADER.size
+ORDER_OFFSET = -(-(RNG_OFFSET + RNG_STATE.size) // 8) * 8
+
+# Version 1 files held a Mersenne Twister state (624 words, position and the
+# cached gauss value) in place of the stream state
+V1_RNG_STATE = struct.Struct("<625Id")
+V1_ORDER_OFFSET = -(-(RNG_OFFSET + V1_RNG_STATE.size) // 8) * 8
+
+
+def state_file_name(directory: str, list_name: str) -> str:
+    """Return the path of the state file for the named list"""
+    digest = hashlib.sha1(list_name.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"{digest}.seq")
+
+
+def list_fingerprint(items) -> int:
+    """Return a checksum identifying the contents of a list"""
+    if isinstance(items, ItemSequence):
+        fingerprint = items.fingerprint()
+        if fingerprint is not None:
+            return fingerprint
+    checksum = 0
+    for text in items:
+        checksum = zlib.crc32(text.encode("utf-8") + b"\x00", checksum)
+    return checksum
+
+
+class SequentialStateFile:
+    def __init__(self, file_name, match_seed: bool = True):
+        """
+        Args:
+            file_name (str): The path of the state file.
+            match_seed (bool): Whether a saved cycle is only resumed when it was
+                written with the same seed; otherwise the saved stream is adopted.
+        """
+        self.file_name = file_name
+        self.match_seed = match_seed
+        self._file = None
+        self._map = None
+        self._order = None
+
+    def open(self, items, rng: SeededRandom) -> tuple[memoryview, int]:
+        """
+        Map the state file, creating it if it is missing or was written for a
+        different list or seed, and restore the random state it holds.
+
+        Args:
+            items (list): The texts of the loaded list.
+            rng (SeededRandom): The engine's random source.
+
+        Returns:
+            tuple: The mapped permutation, and the cursor to resume from.
+        """
+        if not isinstance(rng, SeededRandom):
+            raise TypeError("Sequential state can only be persisted for a SeededRandom random source")
+        self.close()
+        fingerprint = list_fingerprint(items)
+        typecode = index_typecode(len(items))
+        itemsize = array(typecode).itemsize
+        cursor = 0
+
+        header, rng_state = self._read_header()
+        resume = (
+            header is not None
+            and header[0] == MAGIC and header[1] == VERSION
+            and header[2] == itemsize and header[3] == len(items)
+            and header[5] == fingerprint
+            and (rng_state[0] == rng.seed_value or not self.match_seed)
+        )
+        if not resume:
+            cursor = self._migrate_v1(header, items, typecode, fingerprint, rng)
+            if cursor is None:
+                cursor = 0
+                self._create(index_array(len(items)), fingerprint, rng)
+
+        self._file = open(self.file_name, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        if resume:
+            cursor = header[4]
+            rng.setstate(rng_state)
+
+        self._order = memoryview(self._map)[ORDER_OFFSET:].cast(typecode)
+        return self._order, cursor
+
+    def _migrate_v1(self, header, items, typecode: str, fingerprint: int, rng: SeededRandom):
+        """
+        Rewrite a version 1 file of the same list in the current format, keeping
+        its cycle. Its Mersenne Twister state cannot be carried over, so the
+        engine's current random stream continues from here.
+
+        Returns:
+            int: The cursor to resume from, or None if the file is not a
+                version 1 file of this list.
+        """
+        if (
+            header is None or header[0] != MAGIC or header[1] != 1
+            or header[2] != array(typecode).itemsize or header[3] != len(items)
+            # Version 1 checksummed the texts joined by NUL characters
+            or header[5] != zlib.crc32("\x00".join(items).encode("utf-8"))
+        ):
+            return None
+        order = array(typecode)
+        try:
+            with open(self.file_name, "rb") as state_file:
+                state_file.seek(V1_ORDER_OFFSET)
+                order.fromfile(state_file, len(items))
+        except EOFError:
+            return None
+        self._create(order, fingerprint, rng, header[4])
+        return header[4]
+
+    def save(self, items, order, cursor: int, rng: SeededRandom):
+        """
+        Replace the file with the given cycle, e.g. after the list was edited.
+        The file must not be open.
+        """
+        self._create(order, list_fingerprint(items), rng, cursor)
+
+    def record(self, cursor: int, rng: SeededRandom):
+        """Store the cursor and random state after a draw"""
+        struct.pack_into("<Q", self._map, CURSOR_OFFSET, cursor)
+        RNG_STATE.pack_into(self._map, RNG_OFFSET, *rng.getstate())
+
+    def close(self):
+        if self._order is not None:
+            self._order.release()
+            self._order = None
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_header(self):
+        try:
+            with open(self.file_name, "rb") as state_file:
+                data = state_file.read(RNG_OFFSET + RNG_STATE.size)
+        except FileNotFoundError:
+            return None, None
+        if len(data) < RNG_OFFSET + RNG_STATE.size:
+            return None, None
+        return HEADER.unpack_from(data), RNG_STATE.unpack_from(data, RNG_OFFSET)
+
+    def _create(self, order, fingerprint: int, rng: SeededRandom, cursor: int = 0):
+        os.makedirs(os.path.dirname(self.file_name) or ".", exist_ok=True)
+        with open(self.file_name, "wb") as state_file:
+            state_file.write(HEADER.pack(MAGIC, VERSION, order.itemsize, len(order), cursor, fingerprint))
+            state_file.write(RNG_STATE.pack(*rng.getstate()))
+            state_file.write(bytes(ORDER_OFFSET - RNG_OFFSET - RNG_STATE.size))
+            order.tofile(state_file)
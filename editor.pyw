@@ -6,7 +6,7 @@ from tkinter import ttk, font
 import webbrowser
 
 from core.__info__ import (
-    CONFIG_DIR, SOUNDS_DIR, LOCALE_DIR, LANGUAGE_MAP, EDITOR_SCHEMA,
+    CONFIG_DIR, SOUNDS_DIR, LOCALE_DIR, LANGUAGE_MAP, MAIN_SCHEMA, LISTS_SCHEMA,
     APP_VERSIONS, PROJECT_LINK, PROJECT_TITLE
 )
 from core.ui.widgets import (
@@ -14,14 +14,21 @@ from core.ui.widgets import (
     DynamicLabelframe
 )
 from core.ui.tk_var import DictVar, ListVar
-from core.configuration import EditorAppSettings
-from core.data import JSONHandler, custom_json_dump
+from core.configuration import EditorAppSettings, get_settings
+from core.errors import ValidationError
+from core.compiled_lists import compile_lists
+from core.data import JSONHandler, JSONValidator, custom_json_dump
+from core.list_store import SQLiteListStore
+from core.lists import entry_text
 from core.convert import hex_to_rgb, rgb_to_hex
 from core.ui.base_window import BaseTkWindow
 from core.locale_manager import LocaleManager
 
 from editor.validate_input import is_hex_color, is_in_list, is_valid_font_size
 
+# Seconds app_config.json writes are deferred by, so repeated saves are written once
+CONFIG_WRITE_DELAY = 0.5
+
 
 class ConfigurationUtility(BaseTkWindow):
     def __init__(self, config: EditorAppSettings):
@@ -41,8 +48,29 @@ class ConfigurationUtility(BaseTkWindow):
 
         self.title(self._('WINDOW_TITLE'))
 
-        self.loaded_config = JSONHandler(f"{CONFIG_DIR}/app_config.json")
+        # Edits start from the shared settings snapshot rather than parsing the file again
+        self.loaded_config = JSONHandler(
+            f"{CONFIG_DIR}/app_config.json", write_delay=CONFIG_WRITE_DELAY,
+            data=get_settings(f"{CONFIG_DIR}/app_config.json").data
+        )
+        self.config_validator = JSONValidator(MAIN_SCHEMA)
         self.list_data = JSONHandler(f"{CONFIG_DIR}/lists.json")
+        try:
+            JSONValidator(LISTS_SCHEMA).validate(self.list_data.json_data)
+        except ValidationError as e:
+            # The editor still opens, so that the invalid entries can be fixed
+            self.logger.warning(f"Lists do not match the expected format: {e}")
+
+        # With the SQLite list store, edits are recorded and applied to the database on save
+        self.list_store = None
+        self._list_operations = []
+        if self.loaded_config.get(["generator_config", "list_store"], "json") == "sqlite":
+            self.list_store = SQLiteListStore(f"{CONFIG_DIR}/lists.db")
+            if self.list_store.keys():
+                self.list_data.json_data = self.list_store.to_dict()
+                self.list_data.mark_saved()
+            else:
+                self.list_store.import_lists(self.list_data.json_data)
 
         # Window Bindings
         self.bind('<<NotebookTabChanged>>', lambda _: self.update_idletasks())
@@ -187,6 +215,7 @@ class ConfigurationUtility(BaseTkWindow):
                 # Editor settings
                 ("editor_config", "theme"): self._theme_ctrl.get_backend_value(),
             }
+            valid_updates = {}
             for keys, value in configuration_updates.items():
                 try:
                     # Coerce booleans
@@ -195,16 +224,22 @@ class ConfigurationUtility(BaseTkWindow):
                     # Coerce font size to int if applicable
                     if keys == ("generator_config", "font", "size"):
                         value = int(value)
-                    # Update using the new `set` method in JSONHandler
+                    # Only the changed value is checked against its part of the schema
+                    errors = self.config_validator.validate_path(keys, value)
+                    if errors:
+                        raise ValueError("; ".join(errors))
                     self.logger.debug(f"Updating configuration value for '{' -> '.join(keys)}': {value}")
-                    self.loaded_config.set(list(keys), value)
+                    valid_updates[keys] = value
                 except (ValueError, TypeError) as e:
                     self.logger.warning(
                         f"Skipping invalid value for '{' -> '.join(keys)}': {value} ({e})"
                     )
+            # Apply all updates in a single pass over the configuration
+            self.loaded_config.set_many(valid_updates)
 
             self.logger.info("Syncing list data...")
             self.list_data.overwrite(self._list_data.get())
+            self._revert_list_changes_btn.configure(state="normal" if self.list_data.modified else "disabled")
 
             self.logger.info("Updating configuration previews...")
 
@@ -312,7 +347,7 @@ class ConfigurationUtility(BaseTkWindow):
 
         # Define save controls
         editor_controls = [
-            ("revert_list_changes_btn", "Revert changes", ttk.Button, {"state": "disabled"})
+            ("revert_list_changes_btn", "Revert changes", ttk.Button, {"state": "disabled", "command": self.revert_list_changes})
         ]
         for i, (ctrl_attr_name, text, ctrl_type, options) in enumerate(editor_controls):
             setattr(self, f"_{ctrl_attr_name}", ctrl_type(self._editor_controls, text=text, **options))
@@ -328,38 +363,69 @@ class ConfigurationUtility(BaseTkWindow):
 
         self._editor_tab.grid_rowconfigure(1, weight=1)
 
+    def revert_list_changes(self, *_):
+        self.logger.info("Reverting list changes...")
+        self.list_data.revert()
+        self._list_operations.clear()
+
+        # Rebuild the list and item previews from the reverted data
+        self._current_list = None
+        for listbox in (self.list_lstbx, self.items_lstbx):
+            for item in listbox.treeview.get_children():
+                listbox.treeview.delete(item)
+        for key in self.list_data.json_data:
+            self.list_lstbx.add_item(key)
+        self._list_data.set(self.list_data.json_data)
+
     def create_new_list(self, *_):
         new_list = self.list_textbox.get()
         if new_list != "" and new_list not in self._list_data.keys():
             self.list_lstbx.add_item(new_list)
             self._list_data.update(new_list, [])
+            self._list_operations.append(("create", new_list))
         
     def remove_list(self, *_):
         selection = self.list_lstbx.treeview.selection()
         for item in selection:
             list_name = self.list_lstbx.treeview.item(item, 'text')
             self._list_data.remove(list_name)
+            self._list_operations.append(("remove", list_name))
         self.list_lstbx.rem_item()
         self.list_lstbx.treeview.selection_add(self.list_lstbx.treeview.get_children()[0])
 
     def add_list_item(self, *_):
+        if self._is_external_list(self._current_list):
+            self.logger.warning(f"Items of '{self._current_list}' are read from an external source")
+            return
         new_item = self.items_textbox.get()
-        list_data = []
-        for item in self.items_lstbx.treeview.get_children():
-            list_data.append(self.items_lstbx.treeview.item(item, 'text'))
+        list_data = self._current_list_entries()
 
-        if new_item != "" and new_item not in list_data:
+        if new_item != "" and new_item not in [entry_text(entry) for entry in list_data]:
             list_data.append(new_item)
             self.items_lstbx.add_item(new_item)
             self._list_data.update(self._current_list, list_data)
+            self._list_operations.append(("insert", self._current_list, new_item))
 
     def rem_list_item(self, *_):
+        if self._is_external_list(self._current_list):
+            self.logger.warning(f"Items of '{self._current_list}' are read from an external source")
+            return
+        for item in self.items_lstbx.treeview.selection():
+            self._list_operations.append(("delete", self._current_list, self.items_lstbx.treeview.item(item, 'text')))
         self.items_lstbx.rem_item()
-        list_data = []
+        self._list_data.update(self._current_list, self._current_list_entries())
+
+    def _is_external_list(self, list_name) -> bool:
+        return isinstance(self._list_data.find(list_name), dict)
 
+    def _current_list_entries(self) -> list:
+        """Rebuild the current list from the item preview, keeping any entry attributes (e.g. weights)"""
+        saved_entries = {entry_text(entry): entry for entry in self._list_data.find(self._current_list, [])}
+        list_data = []
         for item in self.items_lstbx.treeview.get_children():
-            list_data.append(self.items_lstbx.treeview.item(item, 'text'))
-        self._list_data.update(self._current_list, list_data)
+            text = self.items_lstbx.treeview.item(item, 'text')
+            list_data.append(saved_entries.get(text, text))
+        return list_data
 
 
     def _load_list(self, _):
@@ -384,9 +450,12 @@ class ConfigurationUtility(BaseTkWindow):
 
         # Load the new list
         self.logger.info(f"Loading list: {self._current_list}")
+        if self._is_external_list(self._current_list):
+            self.logger.info(f"  -> Items are read from '{self._list_data.find(self._current_list).get('source')}'")
+            return
         item_count = 0
         for item in self._list_data.find(self._current_list):
-            self.items_lstbx.add_item(item)
+            self.items_lstbx.add_item(entry_text(item))
             item_count += 1
         self.logger.info(f"  -> Loaded {item_count} values")
 
@@ -643,16 +712,33 @@ class ConfigurationUtility(BaseTkWindow):
         self._save_status_lbl.configure(text="Saving...")
 
         self.loaded_config.write()
-        self.list_data.write()
+        if self.list_store is not None:
+            self.list_store.apply(self._list_operations)
+            self._list_operations.clear()
+            self.list_data.mark_saved()
+        else:
+            # Written immediately, as the lists are compiled from the file
+            self.list_data.write()
+            try:
+                compile_lists(f"{CONFIG_DIR}/lists.json", f"{CONFIG_DIR}/lists.bin")
+            except (OSError, ValidationError) as e:
+                # The generator recompiles on its next start if this fails (e.g. the file is mapped on Windows)
+                self.logger.warning(f"Unable to compile lists: {e}")
+        self._revert_list_changes_btn.configure(state="disabled")
         
         self._save_status_lbl.configure(text="Configuration saved!")
         self.after(1000, lambda: self._save_status_lbl.configure(text=previous_text))
         self._save_btn.configure(state="normal")
 
 
+    def _on_closing(self, *_):
+        self.loaded_config.flush()
+        super()._on_closing()
+
+
 if __name__ == "__main__":
     try:
-        APP_CONFIG = EditorAppSettings(f"{CONFIG_DIR}/app_config.json", EDITOR_SCHEMA)
+        APP_CONFIG = get_settings(f"{CONFIG_DIR}/app_config.json").editor
         instance = ConfigurationUtility(APP_CONFIG)
     except Exception as e:
         print(traceback.format_exc())
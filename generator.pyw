@@ -1,19 +1,30 @@
+import os
 import random
 import threading
 import tkinter as tk
-from tkinter import ttk
+from tkinter import simpledialog, ttk
 
 from core.__info__ import (
-    CONFIG_DIR, GENERATOR_SCHEMA, LOCALE_DIR, SOUNDS_DIR
+    CONFIG_DIR, LOCALE_DIR, SOUNDS_DIR, STATE_DIR
 )
-from core.configuration import GeneratorAppSettings
-from core.data import JSONHandler
+from core.configuration import GeneratorAppSettings, get_settings
+from core.errors import ValidationError
+from core.list_store import open_list_store
+from core.prng import SeededRandom, derive_seed
+from core.selection import DrawMode, SelectionEngine
+from core.state import SequentialStateFile, state_file_name
 from core.ui.widgets.dialogs import ChoiceDialog, DialogAction
 from core.ui.wcag_contrast import determine_text_color
 from core.ui.base_window import BaseTkWindow
 from core.locale_manager import LocaleManager
 from libs.playsound3 import playsound
 
+# Number of members shown per group when rendering a partition
+GROUP_PREVIEW_SIZE = 10
+
+# Interval (ms) at which lists.json is checked for changes saved by the editor
+LISTS_POLL_INTERVAL = 1000
+
 class RandomGenerator(BaseTkWindow):
     def __init__(self, config: GeneratorAppSettings):
         super().__init__(
@@ -35,10 +46,19 @@ class RandomGenerator(BaseTkWindow):
 
         self.title(self._('_window_title'))
 
-        self._list_data = JSONHandler(json_file=f"{CONFIG_DIR}/lists.json")
-        self.loaded_list = []
+        self._list_data = open_list_store(self.config.list_store, CONFIG_DIR)
+        self._lists_stat = self._stat_lists()
+        self.tag_filter = ""
+        self._sampled_source = None
+        self._sample_draws = 0
+        self._background_busy = False
+        self.selection = SelectionEngine()
+        self.selection.set_repeat_window(max(self.config.no_repeat_window, 0))
+        self.random_mode = DrawMode(self.config.random_mode)
+        self.random_seed = self.config.random_seed
+        if self.random_seed is None:
+            self.random_seed = SeededRandom().seed_value
         self.loaded_list_name = tk.StringVar()
-        self.call_index = 0
 
         # Add callback function to update the window title when the list value is changed
         self.loaded_list_name.trace_add('write', callback=lambda a,b,c: self.title(
@@ -49,12 +69,14 @@ class RandomGenerator(BaseTkWindow):
         self.bind("<<ThemeChanged>>", lambda _: self.update_styles(self.cget("background")))
 
         self._define_interface()
+        if self.config.list_store == "json":
+            self.after(LISTS_POLL_INTERVAL, self._watch_lists)
         self.mainloop()
 
 
     def _change_list(self):
         self.logger.info("Change list requested...")
-        available_lists = self._list_data.json_data.keys()
+        available_lists = self._list_data.keys()
 
         self.attributes('-topmost', False)
         dialog = ChoiceDialog(
@@ -75,16 +97,151 @@ class RandomGenerator(BaseTkWindow):
         if dialog.return_value:
             self.logger.info(f"Selected list: '{dialog.return_value}'")
             self.loaded_list_name.set(dialog.return_value)
-            self.call_index = 0
             self._item_lbl.configure(text="")
             self._refresh_list()
 
 
     def _refresh_list(self):
-        new_list = self._list_data.get(self.loaded_list_name.get())
-        self.loaded_list = new_list
-        self._randomize_elements()
-        self.logger.info(f"Loaded list with length {len(new_list)} items")
+        list_name = self.loaded_list_name.get()
+        rng = SeededRandom(derive_seed(self.random_seed, list_name))
+
+        source = self._list_data.source(list_name, CONFIG_DIR)
+        self._sampled_source = source
+        if source is not None:
+            self._sample_source(list_name, source, rng)
+            return
+
+        self._load_entries(list_name, self._list_data.filter(list_name, self.tag_filter), rng)
+
+
+    def _sample_source(self, list_name, source, rng):
+        # The sample is a draw of its own, so the list's draws do not replay its outputs
+        rng.begin_draw()
+        # External sources are sampled by streaming the file, which is done off the UI thread
+        self.logger.info(f"Sampling {source.sample_size} items from external source [{source.file_name}]")
+        self._run_in_background(
+            lambda: source.sample(rng=rng),
+            lambda items: self._load_entries(list_name, items, rng),
+            errors=(OSError, ValueError)
+        )
+
+
+    def _track_sample(self, draw_count):
+        # Once as many items as a sample holds have been drawn from it, it is
+        # replaced by a new sample so that the rest of the file can be drawn too
+        if self._sampled_source is None:
+            return
+        self._sample_draws += draw_count
+        if self._sample_draws >= len(self.selection):
+            self.logger.info("Sample of the external source used up, drawing a new one")
+            self._sample_source(self.loaded_list_name.get(), self._sampled_source, self.selection.rng)
+
+
+    def _load_entries(self, list_name, entries, rng):
+        try:
+            self.selection.load(entries, rng=rng)
+        except ValueError as e:
+            self.logger.error(f"Unable to load list '{list_name}': {e}")
+            return
+        self._sample_draws = 0
+        self.logger.info(f"Loaded list with length {len(self.selection)} items")
+
+        # Filtered subsets keep their own sequential cycle
+        state_key = f"{list_name}?{self.tag_filter}" if self.tag_filter else list_name
+        state_file = state_file_name(STATE_DIR, state_key)
+        try:
+            self.selection.attach_state(SequentialStateFile(
+                state_file, match_seed=self.config.random_seed is not None
+            ))
+            self.logger.info(f"Resuming sequential cycle at item {self.selection.cursor} [{state_file}]")
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.error(f"Unable to persist sequential state: {e}")
+        self.logger.info(
+            f"Random stream for '{list_name}': seed {self.selection.rng.seed_value}, "
+            f"next draw {self.selection.rng.draw_index}"
+        )
+
+
+    def _change_filter(self):
+        self.attributes('-topmost', False)
+        tag_filter = simpledialog.askstring(
+            self._("_btn_filter"), f"{self._('Tags to include, prefix with - to exclude')}:",
+            parent=self, initialvalue=self.tag_filter
+        )
+        self.attributes('-topmost', self.config.app_on_top)
+        if tag_filter is None:
+            return
+
+        self.tag_filter = " ".join(tag_filter.split())
+        self.logger.info(f"Tag filter set to '{self.tag_filter}'")
+        if self.loaded_list_name.get():
+            self._item_lbl.configure(text="")
+            self._refresh_list()
+
+
+    def _stat_lists(self):
+        try:
+            stat = os.stat(f"{CONFIG_DIR}/lists.json")
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+    def _watch_lists(self):
+        try:
+            # A background task may be drawing from the loaded list, so any
+            # change is picked up by the first poll after it has finished
+            lists_stat = self._lists_stat if self._background_busy else self._stat_lists()
+            if lists_stat != self._lists_stat:
+                self._lists_stat = lists_stat
+                self._reload_lists()
+        finally:
+            self.after(LISTS_POLL_INTERVAL, self._watch_lists)
+
+
+    def _reload_lists(self):
+        """Reopen the lists after lists.json changed, patching the loaded list in place"""
+        self.logger.info("Lists have changed, reloading...")
+        previous = self._list_data
+        try:
+            # Only the lists that changed are recompiled
+            self._list_data = open_list_store(self.config.list_store, CONFIG_DIR)
+        except OSError as e:
+            # Retried on the next poll, e.g. when lists.json was still being written
+            self._lists_stat = None
+            self.logger.error(f"Unable to reload lists: {e}")
+            return
+        except (ValueError, ValidationError) as e:
+            self.logger.error(f"Unable to reload lists: {e}")
+            return
+
+        list_name = self.loaded_list_name.get()
+        changed = bool(list_name) and self._list_data.checksum(list_name) != previous.checksum(list_name)
+        was_external = changed and previous.source(list_name) is not None
+        previous.close()
+        if not changed:
+            return
+
+        if list_name not in self._list_data.keys():
+            self.logger.warning(f"List '{list_name}' was removed, keeping the loaded items")
+        elif was_external or self._list_data.source(list_name) is not None:
+            # External sources are sampled afresh rather than patched
+            self._refresh_list()
+        else:
+            try:
+                added, removed = self.selection.patch(self._list_data.filter(list_name, self.tag_filter))
+            except ValueError as e:
+                self.logger.error(f"Unable to patch list '{list_name}', keeping the loaded items: {e}")
+                return
+            self.logger.info(
+                f"Patched list '{list_name}': {added} added, {removed} removed, "
+                f"{len(self.selection) - self.selection.cursor} items left in the sequential cycle"
+            )
+
+
+    def _on_closing(self, *_):
+        self.selection.close_state()
+        super()._on_closing()
 
 
     def _define_interface(self):
@@ -99,13 +256,18 @@ class RandomGenerator(BaseTkWindow):
         buttons = [
             ("_btn_sequential", self.sequential_random, True),
             ("_btn_random", self.random, True),
+            ("_btn_draw_many", self.draw_many, True),
+            ("_btn_teams", self.partition, True),
+            ("_btn_filter", self._change_filter, False),
             ("_btn_chg_list", self._change_list, False)
         ]
 
+        self._control_buttons = []
         for i, (btn_attr_name, command, expand) in enumerate(buttons):
             setattr(self, btn_attr_name, ttk.Button(
                 self._interface_container, text=self._(btn_attr_name), command=command, style="MatchedBg.TButton")
             )
+            self._control_buttons.append(getattr(self, btn_attr_name))
             getattr(self, btn_attr_name).grid(
                 row=1, column=i, sticky="ew", ipady=6, padx=5, pady=5
             )
@@ -114,7 +276,7 @@ class RandomGenerator(BaseTkWindow):
 
         self._interface_container.pack(side="left", fill="both", expand=True, ipadx=20)
         self._item_lbl.grid(
-            row=0, column=0, columnspan=3, sticky="news", padx=5,
+            row=0, column=0, columnspan=len(buttons), sticky="news", padx=5,
             pady=((self._titlebar_height, 0) if hasattr(self, "_titlebar_height") else 0)
         )
         self._interface_container.grid_rowconfigure(0, weight=1)
@@ -123,7 +285,7 @@ class RandomGenerator(BaseTkWindow):
 
     def random(self):
         try:
-            item = random.choice(self.loaded_list)
+            item = self.selection.draw(self.random_mode)
             self._item_lbl.config(text=item)
             self.logger.info(f"Insequential random called, returned '{item}'")
             self._post_selection_actions()
@@ -131,31 +293,112 @@ class RandomGenerator(BaseTkWindow):
             self.logger.error(e)
 
 
-    def sequential_random(self):
-        if len(self.loaded_list) == 0:
-            self.logger.error("Cannot choose from an empty sequence")
+    def draw_many(self):
+        self.attributes('-topmost', False)
+        count = simpledialog.askinteger(
+            self._("_btn_draw_many"), f"{self._('Number of items')}:",
+            parent=self, minvalue=1, maxvalue=max(len(self.selection), 1)
+        )
+        self.attributes('-topmost', self.config.app_on_top)
+        if not count:
+            return
+
+        try:
+            items = self.selection.draw_many(count)
+            self.logger.info(f"Batch random called for {count} items, returned {items}")
+            self._item_lbl.config(text=", ".join(items))
+            self._post_selection_actions(len(items))
+        except (IndexError, ValueError) as e:
+            self.logger.error(e)
+
+
+    def partition(self):
+        self.attributes('-topmost', False)
+        groups = simpledialog.askinteger(
+            self._("_btn_teams"), f"{self._('Number of groups')}:",
+            parent=self, minvalue=1, maxvalue=max(len(self.selection), 1)
+        )
+        self.attributes('-topmost', self.config.app_on_top)
+        if not groups:
             return
-        if self.call_index == (len(self.loaded_list)):
-            self._randomize_elements()
-            self.call_index = 0
 
-        item = self.loaded_list[self.call_index]
+        # Partition off the UI thread so large lists don't freeze the window
+        self._run_in_background(lambda: self.selection.partition(groups), self._show_partition)
 
-        self.logger.info(f"Sequential random called, returned '{item}'")
-        self._item_lbl.config(text=item)
-        self.call_index += 1
-        self._post_selection_actions()
 
+    def _show_partition(self, groups):
+        self.logger.info(f"Partition called for {len(groups)} groups, returned {groups}")
+        lines = []
+        for number, members in enumerate(groups, start=1):
+            line = f"{self._('Group')} {number}: {', '.join(members[:GROUP_PREVIEW_SIZE])}"
+            if len(members) > GROUP_PREVIEW_SIZE:
+                line += f" (+{len(members) - GROUP_PREVIEW_SIZE} {self._('more')})"
+            lines.append(line)
+        self._item_lbl.config(text="\n".join(lines))
+        self._post_selection_actions(sum(map(len, groups)))
 
-    def _randomize_elements(self):
-        self.loaded_list = random.sample(self.loaded_list, len(self.loaded_list))
+
+    def _run_in_background(self, work, on_complete, errors=(ValueError,)):
+        """
+        Run work() on a worker thread with the controls disabled, then pass its
+        result to on_complete(). Exceptions listed in `errors` are expected and
+        logged as a message, any other failure is logged with its traceback.
+        """
+        result = {}
+
+        def worker():
+            try:
+                result["value"] = work()
+            except Exception as e:
+                # Any failure is handed back, otherwise the controls would stay disabled
+                result["error"] = e
+
+        thread = threading.Thread(target=worker, daemon=True)
+        self._background_busy = True
+        self._set_controls_state("disabled")
+        thread.start()
+        self.after(50, self._await_background, thread, result, on_complete, errors)
+
+
+    def _await_background(self, thread, result, on_complete, errors):
+        if thread.is_alive():
+            self.after(50, self._await_background, thread, result, on_complete, errors)
+            return
+
+        self._background_busy = False
+        self._set_controls_state("normal")
+        error = result.get("error")
+        if isinstance(error, errors):
+            self.logger.error(error)
+        elif error is not None or "value" not in result:
+            # Unexpected errors (or a worker that ended without a result) are logged with their traceback
+            exc_info = (type(error), error, error.__traceback__) if error is not None else None
+            self.logger.error(f"Background task failed: {error!r}", exc_info=exc_info)
+        else:
+            on_complete(result["value"])
+
+
+    def _set_controls_state(self, state):
+        for button in self._control_buttons:
+            button.configure(state=state)
+
+
+    def sequential_random(self):
+        try:
+            item = self.selection.sequential()
+            self.logger.info(f"Sequential random called, returned '{item}'")
+            self._item_lbl.config(text=item)
+            self._post_selection_actions()
+        except IndexError as e:
+            self.logger.error(e)
 
 
-    def _post_selection_actions(self):
+    def _post_selection_actions(self, draw_count=1):
         if self.config.enable_sound:
             audio_thread = threading.Thread(target=self._play_sound, daemon=True)
             audio_thread.start()
         self._random_bgcols()
+        self._track_sample(draw_count)
 
 
     def _play_sound(self):
@@ -193,7 +436,7 @@ class RandomGenerator(BaseTkWindow):
 
 if __name__ == "__main__":
     try:
-        APP_CONFIG = GeneratorAppSettings(f"{CONFIG_DIR}/app_config.json", GENERATOR_SCHEMA)
+        APP_CONFIG = get_settings(f"{CONFIG_DIR}/app_config.json").generator
         instance = RandomGenerator(APP_CONFIG)
     except Exception as e:
         print(e)